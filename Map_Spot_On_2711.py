@@ -1,8 +1,9 @@
-import csv
 import streamlit as st
 import folium
 from streamlit_folium import st_folium
 import os
+from catalog import load_spots
+from catalog_dir import load_catalog_dir
 
 
 def get_icon_color(location_type): #different colours for icons, based on type of spot
@@ -13,28 +14,19 @@ def get_icon_color(location_type): #different colours for icons, based on type o
     }
     return color_map.get(location_type, 'gray')
 
-def process_csv_file(file_path): #separated processing of the CSV files with rows: Name, Coordinates, Type
-    data = []
+def process_csv_file(file_path): #separated processing of the CSV files with rows: Name, Coordinates, Type -> shared with SO_GPT_MAT.py in catalog.py
     try:
-        with open(file_path, 'r') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                try:
-                    latitude, longitude = map(str.strip, row['Coordinates'].split(","))
-                    data.append({
-                        'name': row['ï»¿Name'],
-                        'type': row['Type'],
-                        'latitude': float(latitude),
-                        'longitude': float(longitude)
-                    })
-                except (KeyError, ValueError) as e:
-                    st.error(f"Error processing row: {row} - {e}")
+        data = load_spots(file_path) #delimiter, encoding and BOM are detected from the file
+        if data.skipped:
+            st.error(f"Skipped {data.skipped} rows with invalid coordinates in {file_path}")
     except FileNotFoundError:
         st.error(f"File not found: {file_path}")
+        return None
     except Exception as e:
         st.error(f"Error reading file {file_path}: {e}")
+        return None
     
-    return data if data else None
+    return data if len(data) else None
 
 def create_map_with_feature_groups(csv_files): #create folium feature group for the map, based on spot lists from CSV
     SG_CENTER = [47.4245, 9.3767]
@@ -44,12 +36,12 @@ def create_map_with_feature_groups(csv_files): #create folium feature group for
         feature_group = folium.FeatureGroup(name=os.path.splitext(os.path.basename(csv_file))[0]) #creates the name of the folium feature group based on the CSV file name
         data = process_csv_file(csv_file)
         if data:
-            for spot in data:
-                location = (spot['latitude'], spot['longitude'])
+            for name, spot_type, latitude, longitude in data.rows():
+                location = (latitude, longitude)
                 folium.Marker(
                     location,
-                    popup=f"{spot['name']} ({spot['type']})",
-                    icon=folium.Icon(color=get_icon_color(spot['type'])),
+                    popup=f"{name} ({spot_type})",
+                    icon=folium.Icon(color=get_icon_color(spot_type)),
                 ).add_to(feature_group)
             feature_group.add_to(map)
         else:
@@ -58,11 +50,11 @@ def create_map_with_feature_groups(csv_files): #create folium feature group for
     folium.LayerControl().add_to(map) #adds a menu on the map to switch between layers
     return map
 
-# When a new CSV file from the lists tabs gets created, it needs to go in here -> don't know yet how to make it happen
-csv_files = [
-    'StGallen_Locations_Test.csv',
-    # Add more CSV files here
-]
+# Every CSV dropped into the catalog folder becomes its own layer, next to the test file -> see catalog_dir.py
+catalog = load_catalog_dir('catalog', extra_files=['StGallen_Locations_Test.csv'])
+for message in catalog.errors.values(): #files that can't be read or have no valid rows are left out of the map
+    st.error(message)
+csv_files = catalog.files
 
 map_SG = create_map_with_feature_groups(csv_files)
 
@@ -1,316 +1,123 @@
 import streamlit as st
 import sqlite3
-import hashlib
+import service
+from service import (
+    CSV_FILE_PATH, CATALOG_DIR, SG_CENTER, MAP_ZOOM, LEADERBOARD_SIZE, LISTS_PAGE_SIZE, USERS_PAGE_SIZE, SEARCH_LIMIT,
+    ensure_db, like_list, unlike_list, get_top_lists, get_list_page, get_list_locations,
+    search_locations, search_lists,
+    get_liked_locations, get_saved_locations, save_user, authenticate_user, get_user_profile, update_user_profile,
+    delete_user, get_user_page, hash_password, get_lists_version, get_all_user_created_lists, get_catalog,
+)
+from locations import get_catalog_location_index
+from recommendations import get_recommendations, refresh_if_stale
+from routes import get_route
+from profile_images import UPLOAD_FOLDER, IMAGE_TYPES, store_profile_image, get_thumbnail
+import instrumentation
+from instrumentation import span, timed
+from spatial_index import viewport_bounds, expand_bounds
+from trending_chart import get_chart_png, chart_spec
+from exports import available_formats, export_locations, export_file_name, export_mime
 import os
-import base64
-import json
-import pandas as pd
-import matplotlib.pyplot as plt
-import folium
-from streamlit_folium import st_folium
+
+# The data layer lives in service.py; this script is the Streamlit UI on top of it. Mapping
+# libraries (folium, streamlit_folium) are imported by the map page when it is drawn.
 
 # =============================
 # Configuration
 # =============================
-UPLOAD_FOLDER = "uploaded_images"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+NEARBY_RADIUS_M = 300  # "spots near this marker" radius on the Map tab
+VIEWPORT_MARGIN = 0.5  # viewport mode loads markers up to half a screen beyond each edge
+TRENDING_CHART = "image"  # "image": cached matplotlib PNG, "vega": drawn by the browser, no matplotlib
+PROFILE = os.environ.get("SPOTON_PROFILE") == "1"  # timing spans, SQL counts, JSON log lines, sidebar debug panel
+PAGE_NAMES = ["Profile", "Map", "Popular Locations"]
+KEPT_WIDGET_STATE = ["map_render_mode", "map_viewport_mode", "map_routes", "nearby_types", "export_format"]
 
-CSV_FILE_PATH = "final_CSV.csv"  # Your CSV with Name,Coordinates,Type
-CSV_SEPARATOR = ";"  # Update if your file uses a different delimiter
+if PROFILE:
+    instrumentation.enable()
+    instrumentation.start_run()
 
-# =============================
-# Database and User Management
-# =============================
-
-def init_db():
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            username TEXT PRIMARY KEY,
-            password TEXT,
-            activities TEXT,
-            bio TEXT DEFAULT '',
-            profile_image TEXT DEFAULT '',
-            liked_lists TEXT DEFAULT '',
-            saved_lists TEXT DEFAULT '',
-            user_created_lists TEXT DEFAULT ''
-        )
-    """)
-    columns = [row[1] for row in cursor.execute("PRAGMA table_info(users);")]
-    if 'liked_lists' not in columns:
-        cursor.execute("ALTER TABLE users ADD COLUMN liked_lists TEXT DEFAULT ''")
-    if 'saved_lists' not in columns:
-        cursor.execute("ALTER TABLE users ADD COLUMN saved_lists TEXT DEFAULT ''")
-    if 'user_created_lists' not in columns:
-        cursor.execute("ALTER TABLE users ADD COLUMN user_created_lists TEXT DEFAULT ''")
-    conn.commit()
-    conn.close()
-
-def save_user(username, password, activities, bio='', profile_image=''):
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO users (username, password, activities, bio, profile_image) VALUES (?, ?, ?, ?, ?)",
-        (username, password, ",".join(activities), bio, profile_image)
-    )
-    conn.commit()
-    conn.close()
-
-def authenticate_user(username, password):
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT password FROM users WHERE username = ?", (username,))
-    result = cursor.fetchone()
-    conn.close()
-    if result and result[0] == hash_password(password):
-        return True
-    return False
-
-def get_user_profile(username):
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT activities, bio, profile_image, liked_lists, saved_lists, user_created_lists 
-        FROM users WHERE username = ?
-    """, (username,))
-    result = cursor.fetchone()
-    conn.close()
-    if result:
-        activities, bio, profile_image, liked_lists, saved_lists, user_created_lists = result
-        return {
-            "activities": activities.split(",") if activities else [],
-            "bio": bio,
-            "profile_image": profile_image,
-            "liked_lists": json.loads(liked_lists) if liked_lists else {},
-            "saved_lists": json.loads(saved_lists) if saved_lists else {},
-            "user_created_lists": json.loads(user_created_lists) if user_created_lists else {}
-        }
-    return None
-
-def update_user_profile(username, new_username=None, new_password=None, new_bio=None, new_profile_image=None,
-                        new_activities=None, new_liked_lists=None, new_saved_lists=None, new_user_created_lists=None):
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-    if new_username:
-        cursor.execute("UPDATE users SET username = ? WHERE username = ?", (new_username, username))
-    if new_password:
-        cursor.execute("UPDATE users SET password = ? WHERE username = ?", (new_password, username))
-    if new_bio is not None:
-        cursor.execute("UPDATE users SET bio = ? WHERE username = ?", (new_bio, username))
-    if new_profile_image is not None:
-        cursor.execute("UPDATE users SET profile_image = ? WHERE username = ?", (new_profile_image, username))
-    if new_activities is not None:
-        cursor.execute("UPDATE users SET activities = ? WHERE username = ?", (",".join(new_activities), username))
-    if new_liked_lists is not None:
-        cursor.execute("UPDATE users SET liked_lists = ? WHERE username = ?", (json.dumps(new_liked_lists), username))
-    if new_saved_lists is not None:
-        cursor.execute("UPDATE users SET saved_lists = ? WHERE username = ?", (json.dumps(new_saved_lists), username))
-    if new_user_created_lists is not None:
-        cursor.execute("UPDATE users SET user_created_lists = ? WHERE username = ?", (json.dumps(new_user_created_lists), username))
-
-    conn.commit()
-    conn.close()
-
-def delete_user(username):
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM users WHERE username = ?", (username,))
-    conn.commit()
-    conn.close()
-
-def get_all_users():
-    conn = sqlite3.connect("users.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT username FROM users")
-    users = cursor.fetchall()
-    conn.close()
-    return [user[0] for user in users]
-
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def get_base64_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode()
-
-init_db()
+ensure_db()
 
 # =============================
 # Load Locations from CSV
 # =============================
 
-def load_locations_from_csv(file_path, sep=","):
-    #error message for file not found
-    if not os.path.exists(file_path):
-        st.warning(f"CSV file not found at: {file_path}")
-        return pd.DataFrame(columns=["Name", "Latitude", "Longitude", "Type"])
-
-    # Attempt to read and skip bad lines if any
-    data = pd.read_csv(file_path, sep=CSV_SEPARATOR, dtype=str, on_bad_lines='skip')
-
-    #error message if expecting columns: Name, Coordinates, Type wrongly named/not findable
-    if not {"Name", "Coordinates", "Type"}.issubset(set(data.columns)):
-        st.warning("CSV file is missing required columns: Name, Coordinates, Type")
-        return pd.DataFrame(columns=["Name", "Latitude", "Longitude", "Type"])
-
-    # Parse Coordinates column to extract Latitude and Longitude
-    def parse_coordinates(coord_str):
-        # coord_str expected like "47.4245,9.3767"
-        # Handle cases if quotes or spaces
-        coord_str = coord_str.strip().replace('"','')
-        parts = coord_str.split(",")
-        if len(parts) == 2:
-            try:
-                lat = float(parts[0].strip())
-                lon = float(parts[1].strip())
-                return lat, lon
-            except ValueError:
-                return None, None
-        return None, None
-
-    data["Latitude"] = None
-    data["Longitude"] = None
-
-    for i, row in data.iterrows():
-        lat, lon = parse_coordinates(row["Coordinates"])
-        data.at[i, "Latitude"] = lat
-        data.at[i, "Longitude"] = lon
-
-    # Drop rows with invalid coords
-    data = data.dropna(subset=["Latitude", "Longitude"])
-
-    # Final cleaned dataframe
-    processed_locations = data[["Name", "Latitude", "Longitude", "Type"]]
-    return processed_locations
-
-# Load CSV data
-locations_df = load_locations_from_csv(CSV_FILE_PATH, sep=CSV_SEPARATOR)
-
-if "logo_base64" not in st.session_state:
-    try:
-        st.session_state["logo_base64"] = get_base64_image("SpotOn_Logo.jpg")
-    except FileNotFoundError:
-        st.warning("Logo file not found.")
-        st.session_state["logo_base64"] = None
-
-def sync_user_data_to_db():
+@timed
+def load_catalog():
+    # All catalog CSVs (catalog_dir.CatalogSet), once per rerun; files that can't be used are reported
+    catalog = get_catalog()
+    for message in catalog.errors.values():
+        st.warning(message)
+    if not catalog.files:
+        st.warning(f"No spot CSV found at {CSV_FILE_PATH} or in {CATALOG_DIR}/")
+    return catalog
+
+# The script's globals start fresh on every rerun, so this holds data that several parts of
+# one rerun need (key -> value); it is computed on first use and gone on the next rerun
+rerun_data = {}
+
+def once_per_rerun(key, compute):
+    if key not in rerun_data:
+        rerun_data[key] = compute()
+    return rerun_data[key]
+
+def get_catalog_snapshot():
+    return once_per_rerun("catalog", load_catalog)
+
+def get_catalog_index():
+    # Catalog spots with their stable ids (locations.LocationIndex), loaded by the pages that
+    # pick spots from the catalog. Built once per catalog version, reruns reuse it.
+    catalog = get_catalog_snapshot()
+    return get_catalog_location_index(catalog) if catalog.files else None
+
+def get_lists_snapshot():
+    # get_all_user_created_lists(), read at most once per rerun
+    return once_per_rerun("all_lists", get_all_user_created_lists)
+
+
+@timed
+def sync_user_data_to_db(renamed_lists=None):
     if "logged_in_user" in st.session_state:
+        # likes are not synced from here, like_list()/unlike_list() write them straight away
         username = st.session_state["logged_in_user"]
-        liked_lists = st.session_state.get("liked_flags", {})
         saved_lists = st.session_state.get("saved_lists", {})
         user_created_lists = st.session_state.get("user_created_lists", {})
         update_user_profile(
             username,
-            new_liked_lists=liked_lists,
             new_saved_lists=saved_lists,
-            new_user_created_lists=user_created_lists
+            new_user_created_lists=user_created_lists,
+            renamed_lists=renamed_lists
         )
 
+@timed
 def load_user_data_from_db(username):
     user_profile = get_user_profile(username)
     if user_profile:
         st.session_state.liked_flags = user_profile["liked_lists"]
         st.session_state.saved_lists = user_profile["saved_lists"]
         st.session_state.user_created_lists = user_profile["user_created_lists"]
-        if "list_likes" not in st.session_state:
-            st.session_state.list_likes = {}
-        for k, v in st.session_state.user_created_lists.items():
-            if k not in st.session_state.list_likes:
-                st.session_state.list_likes[k] = v.get("likes", 0)
-            if k not in st.session_state.liked_flags:
-                st.session_state.liked_flags[k] = False
     else:
         st.session_state.liked_flags = {}
         st.session_state.saved_lists = {}
         st.session_state.user_created_lists = {}
-        st.session_state.list_likes = {}
-
-def get_all_user_created_lists():
-    all_users = get_all_users()
-    combined_user_lists = {}
-    for user in all_users:
-        profile = get_user_profile(user)
-        if profile and profile["user_created_lists"]:
-            for lst_name, lst_data in profile["user_created_lists"].items():
-                combined_user_lists[lst_name] = lst_data
-    return combined_user_lists
-
-def generate_liked_locations_csv():
-    liked_locations = []
-    all_lists = get_all_user_created_lists()
-    if "liked_flags" in st.session_state:
-        for list_name, data in all_lists.items():
-            if st.session_state.liked_flags.get(list_name, False):
-                liked_locations.extend([
-                    {"Name": loc["name"], "Type": loc["type"]}
-                    for loc in data["locations"]
-                ])
-    liked_df = pd.DataFrame(liked_locations)
-    file_path = "liked_locations.csv"
-    if not liked_df.empty:
-        liked_df.to_csv(file_path, index=False)
-    else:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        file_path = None
-    return file_path
-
-def save_list_as_csv(list_name):
-    all_lists = get_all_user_created_lists()
-    locations = all_lists[list_name]["locations"]
-    saved_df = pd.DataFrame(locations)
-    file_path = f"{list_name.replace(' ', '_')}_saved.csv"
-    saved_df.to_csv(file_path, index=False)
-    st.session_state.saved_lists[list_name] = file_path
+
+def save_list(list_name):
+    st.session_state.saved_lists[list_name] = ""
     sync_user_data_to_db()
-    return file_path
-
-def generate_saved_lists_csv():
-    saved_lists = []
-    all_lists = get_all_user_created_lists()
-    if "saved_lists" in st.session_state:
-        for list_name, file_path in st.session_state.saved_lists.items():
-            if list_name in all_lists:
-                locations = all_lists[list_name]["locations"]
-                for loc in locations:
-                    saved_lists.append({
-                        "List Name": list_name,
-                        "Name": loc["name"],
-                        "Type": loc["type"]
-                    })
-    saved_df = pd.DataFrame(saved_lists)
-    file_path = "saved_lists.csv"
-    if not saved_df.empty:
-        saved_df.to_csv(file_path, index=False)
-    else:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            file_path = None
-    return file_path
 
 def delete_created_list(list_name):
     if "logged_in_user" in st.session_state and "user_created_lists" in st.session_state:
         if list_name in st.session_state.user_created_lists:
             del st.session_state.user_created_lists[list_name]
-            if "list_likes" in st.session_state and list_name in st.session_state.list_likes:
-                del st.session_state.list_likes[list_name]
             if "liked_flags" in st.session_state and list_name in st.session_state.liked_flags:
                 del st.session_state.liked_flags[list_name]
             if "saved_lists" in st.session_state and list_name in st.session_state.saved_lists:
                 del st.session_state.saved_lists[list_name]
             sync_user_data_to_db()
 
-def edit_created_list(original_name, new_name, new_locations):
-    updated_locations = []
-    for loc in new_locations:
-        loc_name = loc["name"]
-        loc_type = loc["type"]
-        match = locations_df[(locations_df["Name"] == loc_name) & (locations_df["Type"] == loc_type)]
-        if not match.empty:
-            lat = float(match.iloc[0]["Latitude"])
-            lon = float(match.iloc[0]["Longitude"])
-            updated_locations.append({"name": loc_name, "type": loc_type, "latitude": lat, "longitude": lon})
+def edit_created_list(original_name, new_name, new_location_ids):
+    location_index = get_catalog_index()
+    updated_locations = location_index.locations(new_location_ids) if location_index else []
 
     if "logged_in_user" in st.session_state and "user_created_lists" in st.session_state:
         if original_name in st.session_state.user_created_lists:
@@ -322,10 +129,6 @@ def edit_created_list(original_name, new_name, new_locations):
                 "locations": updated_locations
             }
 
-            if original_name in st.session_state.list_likes:
-                st.session_state.list_likes[new_name] = st.session_state.list_likes[original_name]
-                del st.session_state.list_likes[original_name]
-
             if original_name in st.session_state.liked_flags:
                 st.session_state.liked_flags[new_name] = st.session_state.liked_flags[original_name]
                 del st.session_state.liked_flags[original_name]
@@ -334,95 +137,141 @@ def edit_created_list(original_name, new_name, new_locations):
                 st.session_state.saved_lists[new_name] = st.session_state.saved_lists[original_name]
                 del st.session_state.saved_lists[original_name]
 
-            sync_user_data_to_db()
+            # the rename and the new contents go in one transaction
+            sync_user_data_to_db(renamed_lists={original_name: new_name} if new_name != original_name else None)
 
 def get_emoji_for_type(place_type):
     return {"Nightclub": "🕺", "Restaurant": "🍴", "Bar": "🍸"}.get(place_type, "❓")
 
-def get_icon_color(location_type): 
-    color_map = {
-        'Nightclub': 'red',
-        'Bar': 'blue',
-        'Restaurant': 'green'
+def pick_locations(key, location_index, initial_ids=()):
+    # Type-ahead spot picker: a search box and a type filter feed the multiselect, whose options
+    # are only the current matches (service.search_locations) plus the spots already picked, so
+    # the browser never receives the whole catalog. -> picked location ids, in pick order
+    picked_key = f"{key}_picked"
+    if picked_key not in st.session_state:
+        st.session_state[picked_key] = [i for i in initial_ids if i in location_index]
+    picked = st.session_state[picked_key]
+
+    search_col, type_col = st.columns([3, 2])
+    query = search_col.text_input("Search spots", key=f"{key}_query", placeholder="Name, e.g. Trischli")
+    types = type_col.multiselect("Type", options=sorted(get_catalog_snapshot().spots.types.tolist()),
+                                 key=f"{key}_types")
+    # over-fetch a little: the locations table also holds spots that are no longer in the catalog
+    matches = [location_id for location_id, _, _ in search_locations(query, types, SEARCH_LIMIT * 2)
+               if location_id in location_index and location_id not in picked][:SEARCH_LIMIT]
+
+    def remember_picked():
+        st.session_state[picked_key] = list(st.session_state[key])
+
+    return st.multiselect("Select Locations", options=picked + matches, default=picked,
+                          format_func=location_index.label, key=key, on_change=remember_picked)
+
+@timed
+def display_nearby_spots(lat, lon, radius_m=NEARBY_RADIUS_M):
+    # Spots around a clicked marker, from the cached grid index over all catalog files
+    catalog = get_catalog_snapshot()
+    if not catalog.files:
+        return
+    spots, index = catalog.spots, catalog.spot_index()
+    st.subheader(f"Spots within {radius_m} m")
+    type_filter = st.multiselect("Filter by type", options=sorted(spots.types.tolist()), key="nearby_types")
+    indices, distances = index.within_radius(lat, lon, radius_m, types=type_filter)
+    names, types = spots.name_array(), spots.type_array()
+    nearby = [(i, d) for i, d in zip(indices.tolist(), distances.tolist()) if d > 1.0]  # skip the clicked spot itself
+    if not nearby:
+        st.write("No other spots nearby.")
+    for i, distance in nearby:
+        st.markdown(f"- **{names[i]}** {get_emoji_for_type(types[i])} – {distance:.0f} m")
+
+def get_map_viewport():
+    # Last view reported by st_folium (or the initial view), grown by VIEWPORT_MARGIN
+    view = st.session_state.get("map_view", {})
+    if not view:
+        return expand_bounds(viewport_bounds(SG_CENTER, MAP_ZOOM), VIEWPORT_MARGIN)
+    return expand_bounds(view["bounds"], VIEWPORT_MARGIN)
+
+def remember_map_view(map_state):
+    if not map_state:
+        return
+    bounds = map_state.get("bounds") or {}
+    south_west, north_east = bounds.get("_southWest") or {}, bounds.get("_northEast") or {}
+    if south_west.get("lat") is None or north_east.get("lat") is None:
+        return
+    center = map_state.get("center") or {}
+    st.session_state["map_view"] = {
+        "bounds": (south_west["lat"], south_west["lng"], north_east["lat"], north_east["lng"]),
+        "center": [center.get("lat", SG_CENTER[0]), center.get("lng", SG_CENTER[1])],
+        "zoom": map_state.get("zoom") or MAP_ZOOM,
     }
-    return color_map.get(location_type, 'gray')
-
-def process_csv_file(file_path):
-    data = []
-    try:
-        reader = pd.read_csv(file_path, sep=CSV_SEPARATOR, on_bad_lines='skip')
-        # Expect columns: Name, Coordinates, Type
-        if {'Name', 'Coordinates', 'Type'}.issubset(reader.columns):
-            for idx, row in reader.iterrows():
-                coordinates_str = str(row['Coordinates']).strip().replace('"','')
-                parts = coordinates_str.split(",")
-                if len(parts) == 2:
-                    try:
-                        lat = float(parts[0].strip())
-                        lon = float(parts[1].strip())
-                        data.append({
-                            'name': row['Name'],
-                            'type': row['Type'],
-                            'latitude': lat,
-                            'longitude': lon
-                        })
-                    except ValueError:
-                        continue
-                else:
-                    continue
-        else:
-            st.warning("CSV file is missing required columns: Name, Coordinates, Type")
-    except FileNotFoundError:
-        st.error(f"File not found: {file_path}")
-    except Exception as e:
-        st.error(f"Error reading file {file_path}: {e}")
-    
-    return data if data else None
-
-def create_map_with_feature_groups(csv_files, user_lists=None):
-    SG_CENTER = [47.4245, 9.3767]
-    map_obj = folium.Map(location=SG_CENTER, zoom_start=16)
-
-    # Add CSV-based feature groups
-    for csv_file in csv_files:
-        feature_group = folium.FeatureGroup(name=os.path.splitext(os.path.basename(csv_file))[0])
-        data = process_csv_file(csv_file)
-        if data:
-            for spot in data:
-                folium.Marker(
-                    [spot['latitude'], spot['longitude']],
-                    popup=f"{spot['name']} ({spot['type']})",
-                    icon=folium.Icon(color=get_icon_color(spot['type'])),
-                ).add_to(feature_group)
-            feature_group.add_to(map_obj)
-        else:
-            st.error(f"No valid data in file: {csv_file}")
-
-    # Add user-created lists as feature groups
-    if user_lists:
-        for list_name, list_data in user_lists.items():
-            user_feature_group = folium.FeatureGroup(name=f"User List: {list_name}")
-            for loc in list_data["locations"]:
-                folium.Marker(
-                    [loc['latitude'], loc['longitude']],
-                    popup=f"{loc['name']} ({loc['type']})",
-                    icon=folium.Icon(color=get_icon_color(loc['type']))
-                ).add_to(user_feature_group)
-            user_feature_group.add_to(map_obj)
-
-    folium.LayerControl().add_to(map_obj)
-    return map_obj
-
-def display_map():
-    map_SG = create_map_with_feature_groups(csv_files=csv_files, user_lists=all_user_lists)
-    st_folium(map_SG)
+
+@timed
+def display_map(catalog):
+    # imported here so pages without the map don't load folium and streamlit_folium
+    from map_layers import RENDER_MODES
+    from streamlit_folium import st_folium
+    from map_cache import map_cache_key, get_map
+    render_mode = st.radio("Map rendering", RENDER_MODES, horizontal=True, key="map_render_mode")
+    viewport_mode = st.checkbox("Only load markers in view", key="map_viewport_mode")
+    show_routes = st.checkbox("Walking routes", key="map_routes",
+                              help="Draw the shortest walk through the spots of every list")
+    viewport, center, zoom = None, None, MAP_ZOOM
+    if viewport_mode:
+        # The pan/zoom that triggered this rerun is already in session_state under the map's key
+        remember_map_view(st.session_state.get("spot_map"))
+        view = st.session_state.get("map_view", {})
+        viewport, center, zoom = get_map_viewport(), view.get("center"), view.get("zoom", MAP_ZOOM)
+
+    # Assembled again only when the CSVs, the user lists or the view settings change; the
+    # version is read first, so lists changed in between make the next rerun rebuild it
+    cache_key = map_cache_key(catalog.fingerprint, get_lists_version(),
+                              render_mode, viewport, center, zoom, show_routes)
+    folium_map = get_map(cache_key, lambda: service.create_map_with_feature_groups(
+        csv_files=catalog.files, user_lists=get_lists_snapshot(),
+        viewport=viewport, center=center, zoom=zoom, render_mode=render_mode, routes=show_routes
+    ))
+    with span("render_map"):
+        map_state = st_folium(folium_map, key="spot_map", height=700, width=500)
+    clicked = (map_state or {}).get("last_object_clicked")
+    if clicked:
+        display_nearby_spots(clicked["lat"], clicked["lng"])
+    if show_routes:
+        display_itinerary()
+
+def display_itinerary():
+    # Stops of one list in walking order, with the distance of every leg (routes.get_route,
+    # cached like the route layers on the map)
+    user_lists = {name: data for name, data in get_lists_snapshot().items() if len(data["locations"]) >= 2}
+    if not user_lists:
+        return
+    st.subheader("Itinerary")
+    list_name = st.selectbox("List", sorted(user_lists), key="itinerary_list")
+    locations = user_lists[list_name]["locations"]
+    route = get_route(locations)
+    st.caption(f"{route.length_m / 1000:.2f} km as the crow flies, {len(route.order)} stops")
+    legs = [""] + [f" – {leg:.0f} m" for leg in route.legs_m]
+    st.markdown("\n".join(
+        f"{number}. **{locations[position]['name']}** {get_emoji_for_type(locations[position]['type'])}{leg}"
+        for number, (position, leg) in enumerate(zip(route.order, legs), start=1)
+    ))
+
+def show_debug_panel(record):
+    # Timings of this rerun, see instrumentation.py
+    with st.sidebar.expander("Debug: this rerun", expanded=False):
+        st.write(f"**{record['total_ms']:.0f} ms**, {record['queries']} SQL statements")
+        st.dataframe(record["spans"], hide_index=True)
+        st.json(record["statements"], expanded=False)
 
 # Sidebar
 st.sidebar.title("Navigation")
+page = st.sidebar.radio("Page", PAGE_NAMES, key="page")
+# A widget that is not drawn in a rerun loses its value; these are kept while another page is shown
+for key in KEPT_WIDGET_STATE:
+    if key in st.session_state:
+        st.session_state[key] = st.session_state[key]
 if "logged_in_user" in st.session_state:
     if st.sidebar.button("Logout"):
         del st.session_state["logged_in_user"]
-        for key in ["liked_flags", "saved_lists", "user_created_lists", "list_likes"]:
+        for key in ["liked_flags", "saved_lists", "user_created_lists"]:
             if key in st.session_state:
                 del st.session_state[key]
         st.sidebar.success("You have been logged out.")
@@ -455,27 +304,31 @@ else:
             ]
         )
         reg_bio = st.sidebar.text_area("Add a short bio (optional)")
-        reg_uploaded_image = st.sidebar.file_uploader("Upload Profile Picture (Optional)")
-        if reg_uploaded_image:
-            profile_image_path = os.path.join(UPLOAD_FOLDER, reg_uploaded_image.name)
-            with open(profile_image_path, "wb") as f:
-                f.write(reg_uploaded_image.getbuffer())
-        else:
-            profile_image_path = ""
+        reg_uploaded_image = st.sidebar.file_uploader("Upload Profile Picture (Optional)", type=IMAGE_TYPES)
         if st.sidebar.button("Register"):
             if not reg_username or not reg_password or not reg_activities:
                 st.sidebar.error("Please fill in all required fields: Username, Password, and Activities.")
             else:
                 try:
-                    save_user(reg_username, hash_password(reg_password), reg_activities, reg_bio, profile_image_path)
-                    st.sidebar.success("Registration successful! Please log in.")
-                except sqlite3.IntegrityError:
-                    st.sidebar.error("Username already exists. Please choose another.")
+                    # stored as a thumbnail under its content hash, see profile_images.py
+                    profile_image_path = (store_profile_image(reg_uploaded_image.getvalue(), UPLOAD_FOLDER)
+                                          if reg_uploaded_image else "")
+                except ValueError as e:
+                    # a rejected picture registers nothing, the form keeps its values for another try
+                    st.sidebar.error(str(e))
+                else:
+                    try:
+                        save_user(reg_username, hash_password(reg_password), reg_activities, reg_bio, profile_image_path)
+                        st.sidebar.success("Registration successful! Please log in.")
+                    except sqlite3.IntegrityError:
+                        st.sidebar.error("Username already exists. Please choose another.")
 
-# Main Tabs
-tab1, tab2, tab3 = st.tabs(["Profile", "Map", "Popular Locations"])
+# =============================
+# Pages
+# =============================
+# Only the selected page runs on a rerun (st.tabs would run all three and hide two)
 
-with tab1:
+def show_profile_page():
     st.header("Profile")
     if "logged_in_user" not in st.session_state:
         st.info("Please log in to view and edit your profile.")
@@ -484,8 +337,9 @@ with tab1:
         user_profile = get_user_profile(username)
         if user_profile:
             st.subheader("My Profile")
-            if user_profile["profile_image"] and os.path.exists(user_profile["profile_image"]):
-                st.image(user_profile["profile_image"], caption="Your Profile Picture", width=100)
+            profile_thumbnail = get_thumbnail(user_profile["profile_image"])
+            if profile_thumbnail:
+                st.image(profile_thumbnail, caption="Your Profile Picture", width=100)
             else:
                 st.write("No profile picture uploaded.")
             st.write("**Bio:**")
@@ -493,7 +347,7 @@ with tab1:
             st.write("**Activities:**")
             st.write(", ".join(user_profile["activities"]) or "No activities selected.")
 
-            all_lists_combined = get_all_user_created_lists()
+            all_lists_combined = get_lists_snapshot()
 
             # Liked Lists
             st.write("**Liked Lists:**")
@@ -542,23 +396,16 @@ with tab1:
                                 new_name = st.text_input("New List Name", value=lst_name)
 
                                 # Use locations from CSV for selection
-                                if not locations_df.empty:
-                                    all_possible_locations = [
-                                        f"{row['Name']} ({row['Type']})" for idx, row in locations_df.iterrows()
-                                    ]
-                                    current_locations = [f"{loc['name']} ({loc['type']})" for loc in all_lists_combined[lst_name]["locations"]]
-
-                                    new_selected_locations = st.multiselect(
-                                        "Select Locations",
-                                        options=all_possible_locations,
-                                        default=current_locations
+                                location_index = get_catalog_index()
+                                if location_index:
+                                    current_locations = [loc["id"] for loc in all_lists_combined[lst_name]["locations"]
+                                                         if loc["id"] in location_index]
+
+                                    new_selected_locations = pick_locations(
+                                        f"edit_spots_{lst_name}", location_index, current_locations
                                     )
                                     if st.button("Save Changes", key=f"save_changes_{lst_name}"):
-                                        updated_locations = [
-                                            {"name": loc.split(" (")[0], "type": loc.split(" (")[1].replace(")", "")}
-                                            for loc in new_selected_locations
-                                        ]
-                                        edit_created_list(lst_name, new_name, updated_locations)
+                                        edit_created_list(lst_name, new_name, new_selected_locations)
                                         st.success("List updated successfully!")
                                         st.rerun()
                                 else:
@@ -578,13 +425,7 @@ with tab1:
                 new_username = st.text_input("New Username", value=username)
                 new_password = st.text_input("New Password", type="password")
                 new_bio = st.text_area("Bio", value=user_profile.get("bio", ""))
-                uploaded_image = st.file_uploader("Upload Profile Picture (Optional)")
-                if uploaded_image:
-                    profile_image_path = os.path.join(UPLOAD_FOLDER, uploaded_image.name)
-                    with open(profile_image_path, "wb") as f:
-                        f.write(uploaded_image.getbuffer())
-                else:
-                    profile_image_path = user_profile.get("profile_image", "")
+                uploaded_image = st.file_uploader("Upload Profile Picture (Optional)", type=IMAGE_TYPES)
 
                 updated_activities = st.multiselect(
                     "Update Activities",
@@ -600,17 +441,24 @@ with tab1:
                 )
 
                 if st.button("Save Profile Changes"):
-                    update_user_profile(
-                        username,
-                        new_username=new_username if new_username != username else None,
-                        new_password=hash_password(new_password) if new_password else None,
-                        new_bio=new_bio,
-                        new_profile_image=profile_image_path,
-                        new_activities=updated_activities
-                    )
-                    if new_username != username:
-                        st.session_state["logged_in_user"] = new_username
-                    st.success("Profile updated successfully!")
+                    try:
+                        profile_image_path = (store_profile_image(uploaded_image.getvalue(), UPLOAD_FOLDER)
+                                              if uploaded_image else user_profile.get("profile_image", ""))
+                    except ValueError as e:
+                        # a rejected picture saves none of the changes
+                        st.error(str(e))
+                    else:
+                        update_user_profile(
+                            username,
+                            new_username=new_username if new_username != username else None,
+                            new_password=hash_password(new_password) if new_password else None,
+                            new_bio=new_bio,
+                            new_profile_image=profile_image_path,
+                            new_activities=updated_activities
+                        )
+                        if new_username != username:
+                            st.session_state["logged_in_user"] = new_username
+                        st.success("Profile updated successfully!")
 
                 if st.button("Delete Profile Permanently"):
                     delete_user(username)
@@ -620,134 +468,180 @@ with tab1:
 
             # Other User Profiles
             st.subheader("Other User Profiles")
-            users = sorted(get_all_users())
+            search = st.text_input("Search users", key="user_search", placeholder="Username starts with ...").strip()
+            # Keyset paging as in "All Lists": the stack holds the username each visited page starts after
+            if st.session_state.get("user_dir_search") != search or "user_dir_cursors" not in st.session_state:
+                st.session_state.user_dir_search = search
+                st.session_state.user_dir_cursors = [None]
             if "visible_profiles" not in st.session_state:
                 st.session_state["visible_profiles"] = {}
+            # one query for the page of profiles and their list summaries
+            other_users = get_user_page(search, st.session_state.user_dir_cursors[-1], USERS_PAGE_SIZE + 1,
+                                        exclude=username)
+            has_next_users = len(other_users) > USERS_PAGE_SIZE
+            other_users = other_users[:USERS_PAGE_SIZE]
+            if not other_users:
+                st.write("No users found.")
+
+            for other_user_profile in other_users:
+                user = other_user_profile["username"]
+                if st.button(f"{user}", key=f"{user}_button"):
+                    if user in st.session_state["visible_profiles"]:
+                        del st.session_state["visible_profiles"][user]
+                    else:
+                        st.session_state["visible_profiles"][user] = True
 
-            for user in users:
-                if user != username:
-                    if st.button(f"{user}", key=f"{user}_button"):
-                        if user in st.session_state["visible_profiles"]:
-                            del st.session_state["visible_profiles"][user]
-                        else:
-                            st.session_state["visible_profiles"][user] = True
+                if user in st.session_state["visible_profiles"]:
+                    st.write(f"### Profile of {user}")
+                    other_thumbnail = get_thumbnail(other_user_profile["profile_image"])
+                    if other_thumbnail:
+                        st.image(other_thumbnail, caption=f"{user}'s Profile Picture", width=100)
+                    else:
+                        st.write("No profile picture uploaded.")
+                    st.write("**Bio:**")
+                    st.write(other_user_profile["bio"] or "No bio provided.")
+                    st.write("**Activities:**")
+                    st.write(", ".join(other_user_profile["activities"]) or "No activities selected.")
+
+                    if other_user_profile["lists"]:
+                        st.write("**Their Created Lists:**")
+                        for other_list in other_user_profile["lists"]:
+                            # spots are only queried while the list is shown
+                            if st.toggle(f"{other_list['name']} · Spots ({other_list['spots']}) · {other_list['likes']} likes",
+                                         key=f"user_list_{other_list['id']}"):
+                                st.markdown("\n".join(
+                                    f"- **{loc['name']}** {get_emoji_for_type(loc['type'])}"
+                                    for loc in get_list_locations(other_list["id"])
+                                ) or "No locations.")
+
+            users_page_number = len(st.session_state.user_dir_cursors)
+            prev_col, page_col, next_col = st.columns([2, 6, 2])
+            with prev_col:
+                if st.button("← Previous", key="users_prev", disabled=users_page_number == 1):
+                    st.session_state.user_dir_cursors.pop()
+                    st.rerun()
+            page_col.write(f"Page {users_page_number}")
+            with next_col:
+                if st.button("Next →", key="users_next", disabled=not has_next_users):
+                    st.session_state.user_dir_cursors.append(other_users[-1]["username"])
+                    st.rerun()
 
-                    if user in st.session_state["visible_profiles"]:
-                        other_user_profile = get_user_profile(user)
-                        if other_user_profile:
-                            st.write(f"### Profile of {user}")
-                            if other_user_profile["profile_image"] and os.path.exists(other_user_profile["profile_image"]):
-                                st.image(other_user_profile["profile_image"], caption=f"{user}'s Profile Picture", width=100)
-                            else:
-                                st.write("No profile picture uploaded.")
-                            st.write("**Bio:**")
-                            st.write(other_user_profile["bio"] or "No bio provided.")
-                            st.write("**Activities:**")
-                            st.write(", ".join(other_user_profile["activities"]) or "No activities selected.")
-
-                            all_lists_combined_other = get_all_user_created_lists()
-                            if other_user_profile["user_created_lists"]:
-                                st.write("**Their Created Lists:**")
-                                for other_lst_name, other_lst_data in other_user_profile["user_created_lists"].items():
-                                    with st.expander(other_lst_name, expanded=False):
-                                        if other_lst_name in all_lists_combined_other:
-                                            st.write("**Locations:**")
-                                            for loc in all_lists_combined_other[other_lst_name]["locations"]:
-                                                st.markdown(f"- **{loc['name']}** {get_emoji_for_type(loc['type'])}")
-                                        else:
-                                            st.write("No details available.")
-
-with tab2:
+def show_map_page():
     st.header("Map")
     if "logged_in_user" in st.session_state:
         load_user_data_from_db(st.session_state["logged_in_user"])
-    # Get all user-created lists
-    all_user_lists = get_all_user_created_lists()
-    # CSV files for base layers
-    csv_files = [
-        'final_CSV.csv',
-    ]
-
-#this should be in the tab above, 
-#but somehow if I put it in there, it doesn't show up int the tab :(
-display_map()
-
-
-
-
-
-
-
+    # Base layers: one per catalog CSV, see catalog_dir.py
+    display_map(get_catalog_snapshot())
+
+def show_list_row(row, key_prefix=""):
+    # One list of a feed (rows shaped like service.get_list_page()) with Like and Save buttons;
+    # key_prefix tells the widgets apart when a list is shown in more than one feed
+    list_id, l_name, l_owner, l_likes, l_spot_count = row
+    with st.container():
+        col1, col2, col3 = st.columns([6, 2, 2])
+        with col1:
+            st.markdown(f"### {l_name}")
+
+        if "logged_in_user" in st.session_state:
+            with col2:
+                if st.session_state.liked_flags.get(l_name, False):
+                    if st.button("✔️ Liked", key=f"{key_prefix}liked_{l_name}"):
+                        unlike_list(st.session_state["logged_in_user"], list_id)
+                        st.session_state.liked_flags[l_name] = False
+                        st.rerun()
+                else:
+                    if st.button("👍 Like", key=f"{key_prefix}like_{l_name}"):
+                        like_list(st.session_state["logged_in_user"], list_id)
+                        st.session_state.liked_flags[l_name] = True
+                        st.rerun()
 
-    
+            with col3:
+                if l_name in st.session_state.get("saved_lists", {}):
+                    if st.button("✔️ Saved", key=f"{key_prefix}saved_{l_name}"):
+                        del st.session_state.saved_lists[l_name]
+                        sync_user_data_to_db()
+                        st.rerun()
+                else:
+                    if st.button("💾 Save List", key=f"{key_prefix}save_{l_name}"):
+                        save_list(l_name)
+                        st.rerun()
+        else:
+            col2.write("Login to like")
+            col3.write("Login to save")
+
+        st.caption(f"by {l_owner} · {l_likes} likes")
+        # spots are only queried and sent while the list is expanded
+        if st.toggle(f"Spots ({l_spot_count})", key=f"{key_prefix}spots_{list_id}"):
+            st.markdown("\n".join(
+                f"- **{loc['name']}** {get_emoji_for_type(loc['type'])}" for loc in get_list_locations(list_id)
+            ))
+
+def show_export(base_name, label, read_rows, list_names):
+    # Download button for the logged-in user's rows (read_rows(username)) in the chosen format.
+    # The file is built on an explicit "Prepare" click and kept in session state until the
+    # user, the format, the lists or list_names change; st.download_button needs the bytes up
+    # front on every rerun.
+    username = st.session_state["logged_in_user"]
+    export_format = st.session_state["export_format"]
+    version = (username, export_format, get_lists_version(), tuple(sorted(list_names)))
+    prepared = st.session_state.get(f"export_{base_name}")
+    if prepared is None or prepared[0] != version:
+        if not st.button(f"Prepare {label} {export_format}", key=f"prepare_{base_name}"):
+            return
+        prepared = (version, export_locations(read_rows(username), export_format))
+        st.session_state[f"export_{base_name}"] = prepared
+    st.download_button(
+        f"Download {label} {export_format}",
+        data=prepared[1],
+        file_name=export_file_name(base_name, export_format),
+        mime=export_mime(export_format),
+    )
 
-with tab3:
+def show_popular_page():
     st.header("Popular Locations")
-    all_user_lists = get_all_user_created_lists()
-    all_lists = all_user_lists
-
-    if "list_likes" not in st.session_state:
-        st.session_state.list_likes = {}
-        for k, v in all_user_lists.items():
-            st.session_state.list_likes[k] = v.get("likes", 0)
-
-    leaderboard_data = {
-        "List": list(all_lists.keys()),
-        "Likes": [st.session_state.list_likes.get(list_name, all_lists[list_name].get("likes", 0)) for list_name in all_lists]
-    }
-
-    if leaderboard_data["List"]:
-        leaderboard_df = pd.DataFrame(leaderboard_data).sort_values(by="Likes", ascending=False)
+    top_lists = get_top_lists(LEADERBOARD_SIZE)
 
+    if top_lists:
         st.subheader("Trending")
-        fig, ax = plt.subplots(figsize=(8, 5))
-        fig.patch.set_facecolor("#0e1117")
-        ax.set_facecolor("#0e1117")
-        bars = ax.barh(leaderboard_df["List"], leaderboard_df["Likes"], color="skyblue")
-        ax.set_xlabel("Likes", fontsize=12, color="white")
-        ax.tick_params(axis="x", colors="white")
-        ax.tick_params(axis="y", colors="white")
-        for bar in bars:
-            ax.text(bar.get_width() + 0.3, bar.get_y() + bar.get_height() / 2,
-                    f'{int(bar.get_width())}', va='center', fontsize=10, color="white")
-        plt.gca().invert_yaxis()
-        st.pyplot(fig)
+        # rendered once per leaderboard content, see trending_chart.py
+        if TRENDING_CHART == "vega":
+            st.vega_lite_chart(chart_spec(top_lists))
+        else:
+            st.image(get_chart_png(top_lists))
     else:
         st.write("No lists available yet.")
 
+    if "logged_in_user" in st.session_state:
+        st.subheader("Recommended for you")
+        # precomputed from likes and activities, see recommendations.py; a stale batch is
+        # rebuilt in the background while this one is shown
+        refresh_if_stale()
+        recommended = get_recommendations(st.session_state["logged_in_user"])
+        if recommended:
+            for row in recommended:
+                show_list_row(row, key_prefix="recommended_")
+        else:
+            st.write("Like a few lists to get recommendations.")
+
     # Add a New List (only if logged in)
     if "logged_in_user" in st.session_state:
         with st.expander("➕ Add a New List", expanded=False):
             st.markdown("### Create a New List")
 
-            if not locations_df.empty:
-                global_locs = [
-                    {"name": row["Name"], "type": row["Type"], "latitude": row["Latitude"], "longitude": row["Longitude"]}
-                    for idx, row in locations_df.iterrows()
-                ]
+            location_index = get_catalog_index()
+            if location_index:
                 list_name = st.text_input("List Name")
-                options_for_selection = [f"{loc['name']} ({loc['type']})" for loc in global_locs]
-                selected_locations = st.multiselect("Select Locations", options=options_for_selection)
+                selected_locations = pick_locations("add_list_spots", location_index)
 
                 if st.button("Add List", key="add_list_tab3"):
                     if not list_name.strip():
                         st.warning("List name cannot be empty.")
-                    elif list_name in all_user_lists:
+                    elif list_name in get_lists_snapshot():
                         st.warning("A list with this name already exists.")
                     elif not selected_locations:
                         st.warning("You must select at least one location.")
                     else:
-                        updated_locations = []
-                        for loc_str in selected_locations:
-                            loc_name = loc_str.split(" (")[0]
-                            loc_type = loc_str.split(" (")[1].replace(")", "")
-                            match = locations_df[(locations_df["Name"] == loc_name) & (locations_df["Type"] == loc_type)]
-                            if not match.empty:
-                                lat = float(match.iloc[0]["Latitude"])
-                                lon = float(match.iloc[0]["Longitude"])
-                                updated_locations.append({"name": loc_name, "type": loc_type, "latitude": lat, "longitude": lon})
-                            else:
-                                st.warning(f"Coordinates not found for {loc_name} ({loc_type})")
+                        updated_locations = location_index.locations(selected_locations)
 
                         if "user_created_lists" not in st.session_state:
                             st.session_state.user_created_lists = {}
@@ -759,8 +653,9 @@ with tab3:
                         if "liked_flags" not in st.session_state:
                             st.session_state.liked_flags = {}
                         st.session_state.liked_flags[list_name] = False
-                        st.session_state.list_likes[list_name] = 0
                         sync_user_data_to_db()
+                        for key in ("add_list_spots", "add_list_spots_picked"):
+                            st.session_state.pop(key, None)
                         st.success(f"List '{list_name}' created successfully!")
                         st.rerun()
             else:
@@ -770,69 +665,48 @@ with tab3:
         st.write("Log in to create your own lists.")
 
     st.subheader("All Lists")
-    all_user_lists = get_all_user_created_lists()
-    all_lists = all_user_lists
-
-    for l_name, l_details in all_lists.items():
-        with st.container():
-            col1, col2, col3 = st.columns([6, 2, 2])
-            with col1:
-                st.markdown(f"### {l_name}")
-
-            if "logged_in_user" in st.session_state:
-                with col2:
-                    if st.session_state.liked_flags.get(l_name, False):
-                        if st.button("✔️ Liked", key=f"liked_{l_name}"):
-                            st.session_state.liked_flags[l_name] = False
-                            if l_name in st.session_state.list_likes:
-                                st.session_state.list_likes[l_name] = max(st.session_state.list_likes[l_name] - 1, 0)
-                            else:
-                                st.session_state.list_likes[l_name] = 0
-                            if l_name in st.session_state.get("user_created_lists", {}):
-                                st.session_state.user_created_lists[l_name]["likes"] = st.session_state.list_likes[l_name]
-                            sync_user_data_to_db()
-                            st.rerun()
-                    else:
-                        if st.button("👍 Like", key=f"like_{l_name}"):
-                            if l_name in st.session_state.list_likes:
-                                st.session_state.list_likes[l_name] += 1
-                            else:
-                                st.session_state.list_likes[l_name] = 1
-                            st.session_state.liked_flags[l_name] = True
-                            if l_name in st.session_state.get("user_created_lists", {}):
-                                st.session_state.user_created_lists[l_name]["likes"] = st.session_state.list_likes[l_name]
-                            sync_user_data_to_db()
-                            st.rerun()
-
-                with col3:
-                    if l_name in st.session_state.get("saved_lists", {}):
-                        if st.button("✔️ Saved", key=f"saved_{l_name}"):
-                            del st.session_state.saved_lists[l_name]
-                            sync_user_data_to_db()
-                            st.rerun()
-                    else:
-                        if st.button("💾 Save List", key=f"save_{l_name}"):
-                            save_list_as_csv(l_name)
-                            st.rerun()
-            else:
-                col2.write("Login to like")
-                col3.write("Login to save")
-
-            st.markdown("##### Spots:")
-            for loc in l_details["locations"]:
-                st.markdown(f"- **{loc['name']}** {get_emoji_for_type(loc['type'])}")
+    list_query = st.text_input("Search lists", key="list_search").strip()
+    if list_query:
+        # the best matches by name instead of the feed, see service.search_lists
+        page_rows = search_lists(list_query, LISTS_PAGE_SIZE)
+        if not page_rows:
+            st.write("No lists match your search.")
+    else:
+        # Keyset paging: the stack holds the id each visited page starts below (None = newest first)
+        if "all_lists_cursors" not in st.session_state:
+            st.session_state.all_lists_cursors = [None]
+        page_rows = get_list_page(st.session_state.all_lists_cursors[-1], LISTS_PAGE_SIZE + 1)
+        has_next_page = len(page_rows) > LISTS_PAGE_SIZE
+        page_rows = page_rows[:LISTS_PAGE_SIZE]
+
+        if not page_rows:
+            st.write("No lists available yet.")
+
+    for row in page_rows:
+        show_list_row(row)
+
+    if not list_query:
+        page_number = len(st.session_state.all_lists_cursors)
+        prev_col, page_col, next_col = st.columns([2, 6, 2])
+        with prev_col:
+            if st.button("← Newer", key="all_lists_prev", disabled=page_number == 1):
+                st.session_state.all_lists_cursors.pop()
+                st.rerun()
+        page_col.write(f"Page {page_number}")
+        with next_col:
+            if st.button("Older →", key="all_lists_next", disabled=not has_next_page):
+                st.session_state.all_lists_cursors.append(page_rows[-1][0])
+                st.rerun()
+
+    # Exports are built in memory, only after a "Prepare" click, see show_export()
+    if "logged_in_user" in st.session_state:
+        st.selectbox("Export format", available_formats(), key="export_format")
 
     st.subheader("Export Liked Locations")
     if "logged_in_user" in st.session_state:
-        csv_file_path = generate_liked_locations_csv()
-        if csv_file_path and os.path.exists(csv_file_path):
-            with open(csv_file_path, "rb") as file:
-                st.download_button(
-                    "Download Liked Locations CSV",
-                    data=file,
-                    file_name="liked_locations.csv",
-                    mime="text/csv",
-                )
+        liked_names = [name for name, liked in st.session_state.get("liked_flags", {}).items() if liked]
+        if liked_names:
+            show_export("liked_locations", "Liked Locations", get_liked_locations, liked_names)
         else:
             st.write("No liked locations to export.")
     else:
@@ -840,16 +714,16 @@ with tab3:
 
     st.subheader("Export Saved Lists")
     if "logged_in_user" in st.session_state:
-        saved_csv_path = generate_saved_lists_csv()
-        if saved_csv_path and os.path.exists(saved_csv_path):
-            with open(saved_csv_path, "rb") as file:
-                st.download_button(
-                    "Download Saved Lists CSV",
-                    data=file,
-                    file_name="saved_lists.csv",
-                    mime="text/csv",
-                )
+        if st.session_state.get("saved_lists"):
+            show_export("saved_lists", "Saved Lists", get_saved_locations, st.session_state.saved_lists)
         else:
             st.write("No saved lists to export.")
     else:
-        st.write("Log in to export saved lists.")
\ No newline at end of file
+        st.write("Log in to export saved lists.")
+
+PAGES = dict(zip(PAGE_NAMES, [show_profile_page, show_map_page, show_popular_page]))
+with span(f"page:{page}"):
+    PAGES[page]()
+
+if PROFILE:
+    show_debug_panel(instrumentation.finish_run())
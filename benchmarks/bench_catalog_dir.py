@@ -0,0 +1,78 @@
+"""Scan times of a catalog directory with many per-neighbourhood CSVs:
+  python benchmarks/bench_catalog_dir.py --files 10 100 300 --spots-per-file 500 --json catalog_dir.json
+"cold serial"/"cold pool" parse every file (one process / process pool), "rescan" only stats
+them, "touched" hashes every file but parses none, "one changed" parses one file again.
+One file is parsed before the timed scans, so none of them pays for importing pandas, and
+every result says whether the scan really ran on the process pool (with a single CPU the
+"cold pool" scan parses in process).
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import catalog_dir
+from catalog import clear_catalog_cache
+from catalog_dir import get_catalog_directory, ingest_file, clear_catalog_dir_cache
+from synthetic_data import write_catalog_csv
+from bench_cli import make_parser, write_json
+
+
+def timed_scan(directory, force=True):
+    # -> (seconds, CatalogSet, whether the process pool ran)
+    catalog_directory = get_catalog_directory(directory)
+    start = time.perf_counter()
+    catalog = catalog_directory.scan(force=force)
+    return time.perf_counter() - start, catalog, catalog_directory.pool_used
+
+
+def cold_scan(directory, parallel):
+    clear_catalog_dir_cache()
+    clear_catalog_cache()
+    saved = catalog_dir.PARALLEL_MIN_FILES, catalog_dir.PARALLEL_MIN_BYTES
+    if not parallel:
+        catalog_dir.PARALLEL_MIN_FILES = catalog_dir.PARALLEL_MIN_BYTES = float("inf")
+    try:
+        return timed_scan(directory)
+    finally:
+        catalog_dir.PARALLEL_MIN_FILES, catalog_dir.PARALLEL_MIN_BYTES = saved
+
+
+def run(file_counts, spots_per_file):
+    results = []
+    for n_files in file_counts:
+        directory = tempfile.mkdtemp(prefix="spoton_catalog_")
+        try:
+            paths = [write_catalog_csv(os.path.join(directory, f"area_{i:04d}.csv"), spots_per_file, seed=i)
+                     for i in range(n_files)]
+            ingest_file(paths[0])  # warm-up: the first parse imports pandas
+            scans = {}
+            scans["cold serial"] = cold_scan(directory, parallel=False)
+            scans["cold pool"] = cold_scan(directory, parallel=True)
+            catalog = scans["cold pool"][1]
+            assert len(catalog.files) == n_files and len(catalog.spots) == n_files * spots_per_file
+            scans["rescan"] = timed_scan(directory)
+            for path in paths:
+                os.utime(path)
+            scans["touched"] = timed_scan(directory)
+            write_catalog_csv(paths[0], spots_per_file, seed=n_files)
+            scans["one changed"] = timed_scan(directory)
+            assert scans["one changed"][1].fingerprint != catalog.fingerprint
+            for name, (seconds, _, pool_used) in scans.items():
+                results.append({"files": n_files, "spots_per_file": spots_per_file, "scan": name,
+                                "seconds": round(seconds, 4), "pool": pool_used})
+                print(f"{n_files:>6} files  {name:<12} {seconds:8.3f} s{'  (pool)' if pool_used else ''}",
+                      flush=True)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = make_parser(__doc__)
+    parser.add_argument("--files", type=int, nargs="+", default=[10, 100, 300])
+    parser.add_argument("--spots-per-file", type=int, default=500)
+    args = parser.parse_args()
+    write_json(args.json, run(args.files, args.spots_per_file))
@@ -0,0 +1,18 @@
+import json
+import argparse
+
+# Command line shared by the benchmark scripts: the script's docstring is its --help text,
+# and every script can write its results to a JSON file with --json.
+
+
+def make_parser(doc):
+    parser = argparse.ArgumentParser(description=doc, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", help="write the results to this file")
+    return parser
+
+
+def write_json(path, results):
+    # results to path as indented JSON; does nothing without a path (no --json given)
+    if path:
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
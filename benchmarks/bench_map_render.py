@@ -0,0 +1,43 @@
+"""Payload size and build time of one map layer per render mode, as in create_map_with_feature_groups:
+  python benchmarks/bench_map_render.py --sizes 1000 10000 100000 --json map_render.json
+"""
+import os
+import sys
+import time
+import folium
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from map_layers import RENDER_MODES, add_spots
+from synthetic_data import synthetic_spots
+from bench_cli import make_parser, write_json
+
+
+def build_map_html(spots, mode):
+    map_obj = folium.Map(location=[47.4245, 9.3767], zoom_start=16)
+    feature_group = folium.FeatureGroup(name="final_CSV")
+    add_spots(feature_group, *spots, mode=mode)
+    feature_group.add_to(map_obj)
+    folium.LayerControl().add_to(map_obj)
+    return map_obj.get_root().render()
+
+
+def run(sizes, modes):
+    results = []
+    for n in sizes:
+        spots = synthetic_spots(n)
+        for mode in modes:
+            start = time.perf_counter()
+            html = build_map_html(spots, mode)
+            seconds = time.perf_counter() - start
+            results.append({"spots": n, "mode": mode, "seconds": round(seconds, 4),
+                            "payload_bytes": len(html.encode("utf-8"))})
+            print(f"{n:>8} spots  {mode:<8} {seconds:8.3f} s  {len(html) / 1e6:9.2f} MB", flush=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = make_parser(__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--modes", nargs="+", default=RENDER_MODES, choices=RENDER_MODES)
+    args = parser.parse_args()
+    write_json(args.json, run(args.sizes, args.modes))
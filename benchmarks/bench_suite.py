@@ -0,0 +1,181 @@
+"""Timings of the app's main data paths on seeded synthetic data at several scales:
+  python benchmarks/bench_suite.py --scales small medium --json bench_<commit>.json
+  python benchmarks/bench_suite.py --scales small --compare bench_<older commit>.json
+Every scale gets its own catalog CSV and database in a scratch directory; the app's data
+layer (service.py) runs without Streamlit. Benchmarks are named after the app function they
+time, so results stay comparable across commits. "cold" runs clear the process caches
+first, "warm" runs hit them like a rerun of the app does.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, REPO_DIR)
+import database
+import service
+import recommendations
+import routes
+from catalog import load_spots, clear_catalog_cache
+from locations import get_location_index, clear_location_cache
+from map_layers import RENDER_MODES, clear_layer_cache
+from exports import available_formats, export_locations
+from synthetic_data import write_catalog_csv, populate_users
+from bench_cli import make_parser, write_json
+
+SCALES = {
+    "small": {"users": 50, "lists": 200, "locations": 1_000},
+    "medium": {"users": 500, "lists": 2_000, "locations": 10_000},
+    "large": {"users": 2_000, "lists": 20_000, "locations": 100_000},
+}
+SLOWER_THRESHOLD = 1.2  # --compare flags benchmarks whose median grew by more than this factor
+
+
+def clear_caches():
+    clear_catalog_cache()
+    clear_location_cache()
+    clear_layer_cache()
+
+
+def measure(fn, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"runs": repeat, "min_s": min(times), "median_s": statistics.median(times), "max_s": max(times)}
+
+
+def bench_scale(scale, sizes, workdir, repeat, map_modes, seed):
+    results = {}
+    csv_path = write_catalog_csv(os.path.join(workdir, f"catalog_{scale}.csv"), sizes["locations"], seed)
+    database.configure(os.path.join(workdir, f"users_{scale}.db"))
+    service.ensure_db()
+    location_index = get_location_index(csv_path)
+    with database.transaction() as cursor:
+        users = populate_users(cursor, list(location_index.positions), sizes["users"], sizes["lists"], seed=seed)
+
+    # the catalog parse plus the location table sync, and the parse alone
+    results["get_location_index cold"] = measure(lambda: get_location_index(csv_path), repeat, setup=clear_caches)
+    results["get_location_index warm"] = measure(lambda: get_location_index(csv_path), repeat)
+    results["load_spots cold"] = measure(lambda: load_spots(csv_path), repeat, setup=clear_caches)
+    results["load_spots warm"] = measure(lambda: load_spots(csv_path), repeat)
+    results["get_all_user_created_lists"] = measure(service.get_all_user_created_lists, repeat)
+    results["get_user_page first"] = measure(lambda: service.get_user_page(exclude=users[0]), repeat)
+    results["get_user_page last"] = measure(lambda: service.get_user_page(after=users[-2], exclude=users[0]), repeat)
+    results["get_user_page prefix"] = measure(lambda: service.get_user_page("user1", exclude=users[0]), repeat)
+    # type-ahead: a rare substring, one that every spot contains, a typo, a one-letter prefix
+    results["search_locations exact"] = measure(lambda: service.search_locations("Spot 4242"), repeat)
+    results["search_locations common"] = measure(lambda: service.search_locations("pot"), repeat)
+    results["search_locations typo"] = measure(lambda: service.search_locations("Sopt 4242"), repeat)
+    results["search_locations prefix"] = measure(lambda: service.search_locations("S", types=["Bar"]), repeat)
+    results["search_lists"] = measure(lambda: service.search_lists("List 77"), repeat)
+    results["refresh_recommendations"] = measure(recommendations.refresh_recommendations, repeat)
+    results["get_recommendations"] = measure(lambda: recommendations.get_recommendations(users[0]), repeat)
+    stops = location_index.locations(list(location_index.positions)[:200])
+    results["solve_route 200 stops"] = measure(lambda: routes.get_route(stops), repeat, setup=routes.clear_route_cache)
+    results["get_route 200 stops warm"] = measure(lambda: routes.get_route(stops), repeat)
+
+    # One logged-in user's lists, as the app keeps them in session state and syncs them back
+    # (sync_user_data_to_db() passes them on to update_user_profile())
+    profile = service.get_user_profile(users[0])
+    saved_lists, user_created_lists = profile["saved_lists"], profile["user_created_lists"]
+
+    def update_lists():
+        service.update_user_profile(users[0], new_saved_lists=saved_lists, new_user_created_lists=user_created_lists)
+
+    results["update_user_profile lists unchanged"] = measure(update_lists, repeat)
+    spots = next(iter(user_created_lists.values()))["locations"]
+
+    def edit_list():
+        spots.reverse()  # a different order is a change
+
+    results["update_user_profile one list changed"] = measure(update_lists, repeat, setup=edit_list)
+
+    user_lists = service.get_all_user_created_lists()
+    for mode in map_modes:
+        def build_map():
+            service.create_map_with_feature_groups([csv_path], user_lists=user_lists,
+                                                   render_mode=mode).get_root().render()
+        results[f"create_map_with_feature_groups {mode} cold"] = measure(build_map, repeat, setup=clear_layer_cache)
+        results[f"create_map_with_feature_groups {mode} warm"] = measure(build_map, repeat)
+
+    for export_format in available_formats():
+        results[f"export liked {export_format}"] = measure(
+            lambda: export_locations(service.get_liked_locations(users[0]), export_format), repeat)
+        results[f"export saved {export_format}"] = measure(
+            lambda: export_locations(service.get_saved_locations(users[0]), export_format), repeat)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r["scale"], r["benchmark"]): r for r in json.load(f)["results"]}
+    print(f"\ncompared with {baseline_path}:")
+    for result in results:
+        old = baseline.get((result["scale"], result["benchmark"]))
+        if not old:
+            continue
+        ratio = result["median_s"] / old["median_s"] if old["median_s"] else float("inf")
+        flag = "  SLOWER" if ratio > SLOWER_THRESHOLD else ""
+        print(f"{result['scale']:>7} {result['benchmark']:<48} {old['median_s']:10.4f} s -> "
+              f"{result['median_s']:10.4f} s  x{ratio:5.2f}{flag}")
+
+
+def run(scales, repeat, map_modes, seed):
+    workdir = tempfile.mkdtemp(prefix="spoton_bench_")
+    try:
+        results = []
+        for scale in scales:
+            for name, stats in bench_scale(scale, SCALES[scale], workdir, repeat, map_modes, seed).items():
+                results.append({"scale": scale, "benchmark": name, **stats})
+                print(f"{scale:>7} {name:<48} median {stats['median_s']:10.4f} s  (min {stats['min_s']:.4f})",
+                      flush=True)
+        return results
+    finally:
+        database.close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = make_parser(__doc__)
+    parser.add_argument("--scales", nargs="+", default=["small", "medium"], choices=list(SCALES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--map-modes", nargs="+", default=RENDER_MODES, choices=RENDER_MODES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", help="results file of an earlier run to compare against")
+    args = parser.parse_args()
+    results = run(args.scales, args.repeat, args.map_modes, args.seed)
+    if args.json:
+        write_json(args.json, {
+            "meta": {
+                "commit": git_commit(),
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "seed": args.seed,
+                "repeat": args.repeat,
+                "scales": {scale: SCALES[scale] for scale in args.scales},
+            },
+            "results": results,
+        })
+    if args.compare:
+        compare(results, args.compare)
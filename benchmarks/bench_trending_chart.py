@@ -0,0 +1,103 @@
+"""Per-rerun time and resident memory of the "Trending" chart over many reruns:
+  python benchmarks/bench_trending_chart.py --reruns 1000 --json trending_chart.json
+"pyplot" is the old code path (plt.subplots per rerun, never closed, PNG written like st.pyplot),
+"image" the cached PNG and "vega" the Vega-Lite spec. Every --like-every reruns one list
+gains a like, so the cached paths also pay for re-renders.
+"""
+import os
+import sys
+import io
+import time
+import json
+import resource
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from trending_chart import get_chart_png, chart_spec, clear_chart_cache
+from bench_cli import make_parser, write_json
+
+
+def rss_mb():
+    # current resident set size; falls back to the peak where /proc is not available
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def leaderboards(reruns, n_lists, like_every, seed=0):
+    rng = np.random.default_rng(seed)
+    likes = rng.integers(0, 50, n_lists)
+    for i in range(reruns):
+        if i and i % like_every == 0:
+            likes[rng.integers(0, n_lists)] += 1
+        order = np.lexsort((np.arange(n_lists), -likes))
+        yield [(f"List {j}", int(likes[j])) for j in order]
+
+
+def pyplot_chart(rows):
+    fig, ax = plt.subplots(figsize=(8, 5))
+    fig.patch.set_facecolor("#0e1117")
+    ax.set_facecolor("#0e1117")
+    bars = ax.barh([name for name, _ in rows], [count for _, count in rows], color="skyblue")
+    ax.set_xlabel("Likes", fontsize=12, color="white")
+    ax.tick_params(axis="x", colors="white")
+    ax.tick_params(axis="y", colors="white")
+    for bar in bars:
+        ax.text(bar.get_width() + 0.3, bar.get_y() + bar.get_height() / 2,
+                f'{int(bar.get_width())}', va='center', fontsize=10, color="white")
+    plt.gca().invert_yaxis()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=200, bbox_inches="tight")  # st.pyplot's defaults
+    return buffer.getvalue()
+
+
+CHARTS = {
+    "pyplot": pyplot_chart,
+    "image": get_chart_png,
+    "vega": lambda rows: json.dumps(chart_spec(rows)),
+}
+
+
+def run(modes, reruns, n_lists, like_every):
+    results = []
+    for mode in modes:
+        clear_chart_cache()
+        chart = CHARTS[mode]
+        rss_start = rss_mb()
+        times = []
+        for rows in leaderboards(reruns, n_lists, like_every):
+            start = time.perf_counter()
+            chart(rows)
+            times.append(time.perf_counter() - start)
+        times = np.array(times) * 1000
+        result = {
+            "mode": mode,
+            "reruns": reruns,
+            "mean_ms": round(float(times.mean()), 3),
+            "p95_ms": round(float(np.percentile(times, 95)), 3),
+            "total_s": round(float(times.sum()) / 1000, 2),
+            "rss_start_mb": round(rss_start, 1),
+            "rss_end_mb": round(rss_mb(), 1),
+            "open_pyplot_figures": len(plt.get_fignums()),
+        }
+        plt.close("all")
+        results.append(result)
+        print(f"{mode:>7}: {result['mean_ms']:9.3f} ms/rerun (p95 {result['p95_ms']:.3f}), "
+              f"RSS {result['rss_start_mb']:.1f} -> {result['rss_end_mb']:.1f} MB, "
+              f"{result['open_pyplot_figures']} open pyplot figures", flush=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = make_parser(__doc__)
+    parser.add_argument("--modes", nargs="+", default=list(CHARTS), choices=list(CHARTS))
+    parser.add_argument("--reruns", type=int, default=1000)
+    parser.add_argument("--lists", type=int, default=10)
+    parser.add_argument("--like-every", type=int, default=50)
+    args = parser.parse_args()
+    write_json(args.json, run(args.modes, args.reruns, args.lists, args.like_every))
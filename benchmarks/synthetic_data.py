@@ -0,0 +1,60 @@
+import csv
+import random
+import numpy as np
+
+# Seeded synthetic data inside the St. Gallen bounding box: a spot catalog in the app's CSV
+# format (Name, "lat, lon", Type) and users with lists, likes and saves written straight
+# into the app's tables. The same seed always gives the same data.
+
+SG_BOUNDS = (47.405, 9.330, 47.445, 9.420)  # south, west, north, east
+TYPES = np.array(["Nightclub", "Bar", "Restaurant", "Cafe"], dtype=object)
+ACTIVITIES = ["Sightseeing", "Shopping", "Coffee tasting", "Nightlife (clubs/bars)", "Local food tasting",
+              "Live music events", "Rooftop bars", "Biking tours", "Yoga classes", "Theater performances"]
+
+
+def synthetic_spots(n, seed=0):
+    # -> (names, types, latitudes, longitudes) lists of n spots
+    rng = np.random.default_rng(seed)
+    south, west, north, east = SG_BOUNDS
+    names = [f"Spot {i}" for i in range(n)]
+    types = TYPES[rng.integers(0, len(TYPES), n)].tolist()
+    return names, types, rng.uniform(south, north, n).tolist(), rng.uniform(west, east, n).tolist()
+
+
+def write_catalog_csv(path, n_locations, seed=0):
+    names, types, latitudes, longitudes = synthetic_spots(n_locations, seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Name", "Coordinates", "Type"])
+        for name, spot_type, lat, lon in zip(names, types, latitudes, longitudes):
+            writer.writerow([name, f"{lat:.6f}, {lon:.6f}", spot_type])
+    return path
+
+
+def populate_users(cursor, location_ids, n_users, n_lists, spots_per_list=(3, 15), likes_per_user=5,
+                   saves_per_user=2, seed=0):
+    # Users user0..user{n-1} with n_lists lists spread over them; the app's schema must exist.
+    # location_ids: ids of the locations table the lists pick their spots from.
+    rng = random.Random(seed)
+    location_ids = list(location_ids)
+    users = [f"user{i}" for i in range(n_users)]
+    cursor.executemany(
+        "INSERT INTO users (username, password, activities, bio) VALUES (?, ?, ?, ?)",
+        [(user, "x", ",".join(rng.sample(ACTIVITIES, 3)), f"Bio of {user}") for user in users]
+    )
+    list_ids = []
+    for i in range(n_lists):
+        cursor.execute("INSERT INTO lists (owner, name) VALUES (?, ?)", (users[i % n_users], f"List {i}"))
+        list_id = cursor.lastrowid
+        list_ids.append(list_id)
+        spots = rng.sample(location_ids, min(rng.randint(*spots_per_list), len(location_ids)))
+        cursor.executemany(
+            "INSERT INTO list_items (list_id, position, location_id) VALUES (?, ?, ?)",
+            [(list_id, position, location_id) for position, location_id in enumerate(spots)]
+        )
+    for user in users:
+        liked = rng.sample(list_ids, min(likes_per_user, len(list_ids)))
+        saved = rng.sample(list_ids, min(saves_per_user, len(list_ids)))
+        cursor.executemany("INSERT INTO likes (username, list_id) VALUES (?, ?)", [(user, i) for i in liked])
+        cursor.executemany("INSERT INTO saves (username, list_id) VALUES (?, ?)", [(user, i) for i in saved])
+    return users
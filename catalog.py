@@ -0,0 +1,265 @@
+import os
+import codecs
+import hashlib
+import threading
+import numpy as np
+from spatial_index import SpotIndex
+import catalog_binary
+from instrumentation import timed
+
+# =============================
+# Location catalog (Name, Coordinates, Type CSV)
+# =============================
+# Single ingestion path for every spot CSV of the app (Map_Spot_On_2711.py and SO_GPT_MAT.py).
+# Encoding, BOM and delimiter are detected from the file itself, and parsed files are cached
+# for the whole server process, re-read only when the CSV's mtime or size changes, so a
+# Streamlit rerun only pays for one os.stat(). pandas is imported by the first parse. A CSV
+# compiled with catalog_binary.py is mapped from its binary file instead of being parsed.
+
+REQUIRED_COLUMNS = {"Name", "Coordinates", "Type"}
+CANDIDATE_SEPARATORS = [";", ",", "\t", "|"]
+SNIFF_BYTES = 64 * 1024
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+_cache = {}  # (kind, absolute path, sep) -> (mtime_ns, size, parsed result)
+_cache_lock = threading.RLock()  # load_spot_index() builds on load_spots()
+
+
+class SpotColumns:
+    # Columnar spots: float64 coordinates plus dictionary-encoded names and types.
+    # names[name_codes[i]] / types[type_codes[i]] give the strings of spot i.
+    __slots__ = ("latitude", "longitude", "name_codes", "names", "type_codes", "types", "skipped")
+
+    def __init__(self, latitude, longitude, name_codes, names, type_codes, types, skipped=0):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.name_codes = name_codes
+        self.names = names
+        self.type_codes = type_codes
+        self.types = types
+        self.skipped = skipped  # rows dropped because of missing or unparsable coordinates
+
+    def __len__(self):
+        return len(self.latitude)
+
+    def name_array(self):
+        return self.names[self.name_codes]
+
+    def type_array(self):
+        return self.types[self.type_codes]
+
+    def rows(self, indices=None):
+        # (name, type, latitude, longitude) per spot (or only the given positions),
+        # for code that renders spots one by one
+        if indices is None:
+            indices = slice(None)
+        return zip(self.names[self.name_codes[indices]].tolist(), self.types[self.type_codes[indices]].tolist(),
+                   self.latitude[indices].tolist(), self.longitude[indices].tolist())
+
+
+def concat_spots(parts):
+    # One SpotColumns of several, in order. Names keep one dictionary entry per part;
+    # types are merged, so every type string has a single code.
+    parts = list(parts)
+    if not parts:
+        return SpotColumns(np.empty(0), np.empty(0), np.empty(0, dtype=np.int32), np.empty(0, dtype=object),
+                           np.empty(0, dtype=np.int32), np.empty(0, dtype=object))
+    type_codes_by_name = {}
+    name_offset = 0
+    name_codes, type_codes = [], []
+    for part in parts:
+        remap = np.array([type_codes_by_name.setdefault(t, len(type_codes_by_name)) for t in part.types.tolist()],
+                         dtype=np.int32)
+        name_codes.append(part.name_codes + name_offset)
+        type_codes.append(remap[part.type_codes] if len(remap) else part.type_codes)
+        name_offset += len(part.names)
+    return SpotColumns(
+        latitude=np.concatenate([part.latitude for part in parts]),
+        longitude=np.concatenate([part.longitude for part in parts]),
+        name_codes=np.concatenate(name_codes).astype(np.int32),
+        names=np.concatenate([part.names for part in parts]),
+        type_codes=np.concatenate(type_codes).astype(np.int32),
+        types=np.array(list(type_codes_by_name), dtype=object),
+        skipped=sum(part.skipped for part in parts),
+    )
+
+
+def detect_csv_format(file_path):
+    # -> (encoding, separator) guessed from the first bytes of the file
+    with open(file_path, "rb") as f:
+        sample = f.read(SNIFF_BYTES)
+
+    if sample.startswith(codecs.BOM_UTF8):
+        encoding = "utf-8-sig"
+    elif sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        encoding = "utf-16"
+    else:
+        try:
+            sample.decode("utf-8")
+            encoding = "utf-8"
+        except UnicodeDecodeError as e:
+            # a multi-byte character cut off at the end of the sample is still utf-8
+            encoding = "utf-8" if e.start >= len(sample) - 3 else "cp1252"
+
+    text = sample.decode(encoding, errors="ignore")
+    header = text.lstrip("\ufeff").splitlines()[0] if text.strip() else ""
+    # The header row is never quoted, so the separator is simply its most frequent candidate
+    counts = {sep: header.count(sep) for sep in CANDIDATE_SEPARATORS}
+    separator = max(CANDIDATE_SEPARATORS, key=lambda sep: counts[sep])
+    return encoding, (separator if counts[separator] else ",")
+
+
+def parse_coordinates(coordinates):
+    # "47.4245, 9.3767" (quotes and spaces allowed) -> two float64 arrays, NaN where unparsable
+    import pandas as pd
+    cleaned = coordinates.astype(str).str.replace('"', '', regex=False).str.strip()
+    parts = cleaned.str.split(",", expand=True)
+    if parts.shape[1] < 2:
+        nan = np.full(len(coordinates), np.nan)
+        return nan, nan.copy()
+    lat = pd.to_numeric(parts[0].str.strip(), errors="coerce").to_numpy(dtype=np.float64, copy=True)
+    lon = pd.to_numeric(parts[1].str.strip(), errors="coerce").to_numpy(dtype=np.float64, copy=True)
+    if parts.shape[1] > 2:  # more than one comma is not a valid coordinate pair
+        extra = parts.iloc[:, 2:].notna().any(axis=1).to_numpy()
+        lat[extra] = np.nan
+        lon[extra] = np.nan
+    return lat, lon
+
+
+def file_digest(file_path):
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@timed
+def read_spots(file_path, sep=None):
+    # SpotColumns of one spot CSV: mapped from its compiled file (catalog_binary.py) when that
+    # was built from the CSV as it is now, parsed from the text otherwise; sep=None detects the
+    # delimiter. Raises FileNotFoundError, or ValueError when the Name/Coordinates/Type columns
+    # are missing.
+    spots = load_compiled(file_path, sep=sep)
+    return spots if spots is not None else parse_spots(file_path, sep=sep)
+
+
+def parse_spots(file_path, sep=None):
+    import pandas as pd
+    encoding, detected_sep = detect_csv_format(file_path)
+    data = pd.read_csv(file_path, sep=sep or detected_sep, encoding=encoding, encoding_errors="replace",
+                       dtype=str, on_bad_lines='skip')
+    data.columns = [str(column).strip().lstrip("\ufeff") for column in data.columns]
+    if not REQUIRED_COLUMNS.issubset(data.columns):
+        raise ValueError("CSV file is missing required columns: Name, Coordinates, Type")
+
+    lat, lon = parse_coordinates(data["Coordinates"].fillna(""))
+    valid = ~(np.isnan(lat) | np.isnan(lon))  # drop rows with invalid coords
+    name_codes, names = pd.factorize(data["Name"].fillna("").str.strip().to_numpy()[valid])
+    type_codes, types = pd.factorize(data["Type"].fillna("").str.strip().to_numpy()[valid])
+    return SpotColumns(
+        latitude=lat[valid],
+        longitude=lon[valid],
+        name_codes=name_codes.astype(np.int32),
+        names=np.asarray(names, dtype=object),
+        type_codes=type_codes.astype(np.int32),
+        types=np.asarray(types, dtype=object),
+        skipped=int((~valid).sum()),
+    )
+
+
+def compile_catalog(file_path, sep=None):
+    # Build step: parse the CSV once and write its compiled file next to it -> path of that file.
+    # The hash is taken before parsing, so a CSV edited meanwhile leaves a stale file, not a wrong one.
+    stat = os.stat(file_path)
+    digest = file_digest(file_path)
+    spots = parse_spots(file_path, sep=sep)
+    name_blob, name_offsets = catalog_binary.encode_strings(spots.names.tolist())
+    type_blob, type_offsets = catalog_binary.encode_strings(spots.types.tolist())
+    header = {"source_sha1": digest, "source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns,
+              "sep": sep, "skipped": spots.skipped}
+    return catalog_binary.write_artifact(catalog_binary.artifact_path(file_path), header, {
+        "latitude": spots.latitude,
+        "longitude": spots.longitude,
+        "name_codes": spots.name_codes,
+        "type_codes": spots.type_codes,
+        "name_blob": name_blob,
+        "name_offsets": name_offsets,
+        "type_blob": type_blob,
+        "type_offsets": type_offsets,
+    })
+
+
+def load_compiled(file_path, sep=None):
+    # SpotColumns mapped from the compiled file of file_path, None when there is none or it is
+    # stale. Same size and mtime as at compile time is trusted, like the parse cache does;
+    # otherwise the CSV's hash decides. Raises FileNotFoundError when the CSV itself is missing.
+    stat = os.stat(file_path)
+    try:
+        header, arrays = catalog_binary.open_artifact(catalog_binary.artifact_path(file_path))
+    except (FileNotFoundError, ValueError):
+        return None
+    if header["sep"] != sep or header["source_size"] != stat.st_size:
+        return None
+    if header["source_mtime_ns"] != stat.st_mtime_ns and header["source_sha1"] != file_digest(file_path):
+        return None
+    return SpotColumns(
+        latitude=arrays["latitude"],
+        longitude=arrays["longitude"],
+        name_codes=arrays["name_codes"],
+        names=catalog_binary.decode_strings(arrays["name_blob"], arrays["name_offsets"]),
+        type_codes=arrays["type_codes"],
+        types=catalog_binary.decode_strings(arrays["type_blob"], arrays["type_offsets"]),
+        skipped=header["skipped"],
+    )
+
+
+def _cached(kind, file_path, sep, build):
+    key = (kind, os.path.abspath(file_path), sep)
+    stat = os.stat(file_path)
+    cached = _cache.get(key)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        result = build()
+        _cache[key] = (stat.st_mtime_ns, stat.st_size, result)
+        return result
+
+
+def prime_spots(file_path, sep, stat, spots):
+    # Store spots parsed elsewhere (catalog_dir.py's process pool) as load_spots() of the file
+    # version described by stat, so the next load_spots() call doesn't parse it again
+    key = ("spots", os.path.abspath(file_path), sep)
+    with _cache_lock:
+        _cache[key] = (stat.st_mtime_ns, stat.st_size, spots)
+
+
+def load_spots(file_path, sep=None):
+    # Cached read_spots(). The result is shared between sessions, callers must not modify it.
+    return _cached("spots", file_path, sep, lambda: read_spots(file_path, sep=sep))
+
+
+def load_spot_index(file_path, sep=None):
+    # Cached spatial index (spatial_index.SpotIndex) over load_spots(), positions match its arrays
+    return _cached("index", file_path, sep, lambda: SpotIndex.from_spots(load_spots(file_path, sep=sep)))
+
+
+def files_fingerprint(file_paths):
+    # Cheap version hash of a set of CSV files (path, mtime, size), changes whenever one of them does
+    parts = []
+    for file_path in file_paths:
+        try:
+            stat = os.stat(file_path)
+            parts.append(f"{os.path.abspath(file_path)}:{stat.st_mtime_ns}:{stat.st_size}")
+        except FileNotFoundError:
+            parts.append(f"{os.path.abspath(file_path)}:missing")
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def clear_catalog_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import numpy as np
+
+# =============================
+# Compiled catalog files
+# =============================
+# A catalog CSV compiled once into a flat binary file: a JSON header (source hash, size and
+# mtime, separator, array layout) followed by 64-byte aligned arrays. Opening one maps it
+# read-only and wraps the numeric columns with np.frombuffer, so nothing is parsed or copied
+# and every server process shares the same page-cached bytes. Strings are stored as one UTF-8
+# blob plus character offsets per dictionary entry. catalog.py decides when a file is current.
+#   python catalog_binary.py                      compiles final_CSV.csv and catalog/*.csv
+#   python catalog_binary.py some.csv other.csv   compiles the given files
+
+MAGIC = b"SPOTCAT1"
+FORMAT_VERSION = 1
+SUFFIX = ".spotcat"  # written next to its CSV: final_CSV.csv -> final_CSV.csv.spotcat
+ALIGN = 64
+
+_PREFIX = struct.Struct("<8sI")  # magic, header length
+
+
+def artifact_path(csv_path):
+    return csv_path + SUFFIX
+
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def encode_strings(strings):
+    # -> (uint8 UTF-8 blob, int64 character offsets with len(strings) + 1 entries)
+    text = "".join(strings)
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    np.cumsum([len(s) for s in strings], out=offsets[1:])
+    return np.frombuffer(text.encode("utf-8"), dtype=np.uint8), offsets
+
+
+def decode_strings(blob, offsets):
+    # -> object array of the strings, the only part of a compiled file that is copied on load
+    text = blob.tobytes().decode("utf-8")
+    bounds = offsets.tolist()
+    return np.array([text[start:end] for start, end in zip(bounds[:-1], bounds[1:])], dtype=object)
+
+
+def write_artifact(path, header, arrays):
+    # header: JSON-serializable dict, arrays: name -> 1-d numpy array. Written to a temporary
+    # file and renamed, so readers never map a half-written file.
+    layout, offset = {}, 0
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    for name, array in arrays.items():
+        offset = _aligned(offset)
+        layout[name] = [offset, array.dtype.str, len(array)]
+        offset += array.nbytes
+    header_bytes = json.dumps(dict(header, version=FORMAT_VERSION, arrays=layout)).encode("utf-8")
+    data_start = _aligned(_PREFIX.size + len(header_bytes))
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name][0])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(temp_path, path)
+    return path
+
+
+def open_artifact(path):
+    # -> (header, name -> read-only array backed by the mapped file);
+    # FileNotFoundError when there is none, ValueError when it is not a compiled catalog
+    with open(path, "rb") as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise ValueError(f"Not a compiled catalog: {path}")
+        magic, header_length = _PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise ValueError(f"Not a compiled catalog: {path}")
+        header = json.loads(f.read(header_length))
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Compiled catalog {path} has format version {header.get('version')}")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  # stays valid after the file is closed
+    data_start = _aligned(_PREFIX.size + header_length)
+    arrays = {
+        name: (np.frombuffer(mapped, dtype=np.dtype(dtype), count=count, offset=data_start + offset) if count
+               else np.empty(0, dtype=np.dtype(dtype)))
+        for name, (offset, dtype, count) in header["arrays"].items()
+    }
+    return header, arrays
+
+
+if __name__ == "__main__":
+    from catalog import compile_catalog
+    paths = sys.argv[1:]
+    if not paths:
+        paths = ["final_CSV.csv"]
+        if os.path.isdir("catalog"):
+            paths += sorted(os.path.join("catalog", name) for name in os.listdir("catalog")
+                            if name.lower().endswith(".csv"))
+    for csv_path in paths:
+        print(f"{csv_path} -> {compile_catalog(csv_path)}")
@@ -0,0 +1,191 @@
+import os
+import time
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from catalog import read_spots, prime_spots, concat_spots, file_digest
+from spatial_index import SpotIndex
+from instrumentation import timed
+
+# =============================
+# Catalog directory
+# =============================
+# Every *.csv in the catalog directory is a spot source and its own map layer, next to fixed
+# files such as final_CSV.csv. A scan only stats the files: a file whose size or mtime changed
+# is hashed, and only a new hash is parsed again, so touching or copying a file back costs one
+# read. When many files need parsing at once (a cold start, a bulk copy) they are spread over
+# a process pool. The parsed files are merged into one SpotColumns for the location index and
+# the nearby search.
+
+SCAN_INTERVAL_S = 2.0  # a directory is scanned at most this often, reruns in between reuse the last scan
+PARALLEL_MIN_FILES = 16  # parse on a process pool from this many files to (re)parse...
+PARALLEL_MIN_BYTES = 16 * 1024 * 1024  # ...or from this much CSV
+
+_directories = {}  # (directory, extra files, sep) -> CatalogDirectory
+_directories_lock = threading.Lock()
+
+
+def ingest_file(file_path, sep=None):
+    # -> (content hash, SpotColumns or None, error message or None); runs in pool workers too
+    digest = None
+    try:
+        digest = file_digest(file_path)
+        spots = read_spots(file_path, sep=sep)
+    except FileNotFoundError:
+        return digest, None, f"File not found: {file_path}"
+    except ValueError as e:
+        return digest, None, f"{file_path}: {e}"
+    except Exception as e:
+        return digest, None, f"Error reading file {file_path}: {e}"
+    if not len(spots):
+        return digest, None, f"No valid data in file: {file_path}"
+    return digest, spots, None
+
+
+class CatalogFile:
+    __slots__ = ("size", "mtime_ns", "digest", "spots", "error")
+
+    def __init__(self, stat, digest, spots, error):
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self.digest = digest
+        self.spots = spots
+        self.error = error
+
+
+class CatalogSet:
+    # The result of one scan. Shared between sessions, callers must not modify it.
+    def __init__(self, source, parts, errors, fingerprint):
+        self.source = source  # (directory, extra files, sep) it was scanned from
+        self.files = list(parts)  # paths with valid spots, one map layer each, in layer order
+        self.parts = parts  # path -> SpotColumns
+        self.errors = errors  # path -> message, for files that are left out
+        self.fingerprint = fingerprint  # changes whenever the content of a file does
+        self._spots = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    @property
+    def spots(self):
+        # All files merged into one SpotColumns, in self.files order; built on first use
+        if self._spots is None:
+            with self._lock:
+                if self._spots is None:
+                    self._spots = concat_spots(self.parts.values())
+        return self._spots
+
+    def spot_index(self):
+        # Grid index (spatial_index.SpotIndex) over self.spots, positions match its arrays
+        if self._index is None:
+            spots = self.spots
+            with self._lock:
+                if self._index is None:
+                    self._index = SpotIndex.from_spots(spots)
+        return self._index
+
+
+class CatalogDirectory:
+    def __init__(self, directory, extra_files=(), sep=None):
+        self.directory = directory
+        self.extra_files = tuple(extra_files)
+        self.sep = sep
+        self._files = {}  # path -> CatalogFile of the last scan
+        self._snapshot = None
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+        self.pool_used = False  # whether the last scan parsed files on the process pool
+
+    def list_files(self):
+        paths = list(self.extra_files)
+        try:
+            with os.scandir(self.directory) as entries:
+                paths.extend(sorted(entry.path for entry in entries
+                                    if entry.name.lower().endswith(".csv") and entry.is_file()))
+        except FileNotFoundError:
+            pass
+        return list(dict.fromkeys(paths))
+
+    def _parse(self, paths, stats):
+        # -> [(digest, spots, error)] in the order of paths, on a process pool when it pays off
+        self.pool_used = False
+        total_bytes = sum(stats[path].st_size for path in paths)
+        workers = min(len(paths), os.cpu_count() or 1)
+        if workers < 2 or (len(paths) < PARALLEL_MIN_FILES and total_bytes < PARALLEL_MIN_BYTES):
+            return [ingest_file(path, self.sep) for path in paths]
+        try:
+            # spawn: forking the multi-threaded Streamlit server could copy held locks into the workers
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                results = list(pool.map(ingest_file, paths, [self.sep] * len(paths),
+                                        chunksize=max(1, len(paths) // (workers * 4))))
+            self.pool_used = True
+            return results
+        except (BrokenProcessPool, OSError):
+            # no worker processes in this environment, parse here instead
+            return [ingest_file(path, self.sep) for path in paths]
+
+    @timed(name="scan_catalog")
+    def scan(self, force=False):
+        # -> CatalogSet; files are only re-read when they changed since the last scan
+        if self._snapshot is not None and not force and time.monotonic() - self._scanned_at < SCAN_INTERVAL_S:
+            return self._snapshot
+        with self._lock:
+            stats = {}
+            for path in self.list_files():
+                try:
+                    stats[path] = os.stat(path)
+                except FileNotFoundError:
+                    pass
+
+            changed = self._snapshot is None or set(self._files) != set(stats)
+            to_parse = []
+            for path, stat in stats.items():
+                known = self._files.get(path)
+                if known and known.size == stat.st_size and known.mtime_ns == stat.st_mtime_ns:
+                    continue
+                if known and known.digest is not None and file_digest(path) == known.digest:
+                    known.size, known.mtime_ns = stat.st_size, stat.st_mtime_ns  # touched, not changed
+                    if known.spots is not None:
+                        prime_spots(path, self.sep, stat, known.spots)
+                    continue
+                to_parse.append(path)
+
+            for path, (digest, spots, error) in zip(to_parse, self._parse(to_parse, stats)):
+                self._files[path] = CatalogFile(stats[path], digest, spots, error)
+                if spots is not None:
+                    prime_spots(path, self.sep, stats[path], spots)
+                changed = True
+            for path in set(self._files) - set(stats):
+                del self._files[path]
+
+            if changed:
+                parts = {path: self._files[path].spots for path in stats if self._files[path].spots is not None}
+                errors = {path: self._files[path].error for path in stats if self._files[path].error}
+                fingerprint = hashlib.sha1("|".join(
+                    f"{os.path.abspath(path)}:{self._files[path].digest}" for path in stats
+                ).encode("utf-8")).hexdigest()
+                self._snapshot = CatalogSet((self.directory, self.extra_files, self.sep), parts, errors, fingerprint)
+            self._scanned_at = time.monotonic()
+            return self._snapshot
+
+
+def get_catalog_directory(directory, extra_files=(), sep=None):
+    # The process-wide CatalogDirectory of directory plus extra_files, shared by all sessions
+    key = (os.path.abspath(directory), tuple(os.path.abspath(path) for path in extra_files), sep)
+    with _directories_lock:
+        catalog_directory = _directories.get(key)
+        if catalog_directory is None:
+            catalog_directory = _directories[key] = CatalogDirectory(directory, extra_files, sep)
+    return catalog_directory
+
+
+def load_catalog_dir(directory, extra_files=(), sep=None, force=False):
+    # CatalogSet of every CSV in directory plus extra_files (which may be missing); the
+    # directory does not need to exist. Scans are shared by all sessions of the process.
+    return get_catalog_directory(directory, extra_files, sep).scan(force=force)
+
+
+def clear_catalog_dir_cache():
+    with _directories_lock:
+        _directories.clear()
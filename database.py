@@ -0,0 +1,110 @@
+import sqlite3
+import threading
+import queue
+from contextlib import contextmanager
+
+# =============================
+# Shared SQLite connection pool
+# =============================
+# Streamlit re-executes the main script on every rerun, but imported modules stay loaded,
+# so the pool below is shared by all sessions and script threads of the server process.
+
+DB_PATH = "users.db"
+POOL_SIZE = 8  # idle connections kept open; more can be opened under load and are closed on return
+
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",     # readers don't block the writer and vice versa
+    "PRAGMA synchronous = NORMAL",   # safe with WAL, avoids an fsync on every commit
+    "PRAGMA busy_timeout = 5000",    # wait for a lock instead of failing with "database is locked"
+    "PRAGMA cache_size = -16000",    # ~16 MB page cache per connection
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+]
+
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
+_local = threading.local()  # connection of the transaction running on this thread, if any
+_config_lock = threading.Lock()
+_trace_callback = None  # see set_trace_callback()
+
+
+def _open_connection():
+    # isolation_level=None: no implicit transactions, transaction() issues BEGIN/COMMIT itself.
+    # cached_statements keeps the compiled statements of a reused connection around (prepared once).
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None, cached_statements=256)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _release(conn):
+    try:
+        _pool.put_nowait(conn)
+    except queue.Full:
+        conn.close()
+
+
+def configure(db_path):
+    # Point the pool at another database file (scripts, benchmarks); idle connections are dropped
+    global DB_PATH
+    with _config_lock:
+        DB_PATH = db_path
+        close_all()
+
+
+def set_trace_callback(callback):
+    # callback(statement) for every SQL statement run on a borrowed connection, None to stop.
+    # Installed per borrow, so connections carry no callback at all while tracing is off.
+    global _trace_callback
+    _trace_callback = callback
+
+
+def close_all():
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+
+@contextmanager
+def connection():
+    # Borrow a connection for reads; inside a transaction() on this thread, that connection is reused
+    active = getattr(_local, "conn", None)
+    if active is not None:
+        yield active
+        return
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _open_connection()
+    trace = _trace_callback
+    if trace is not None:
+        conn.set_trace_callback(trace)
+    try:
+        yield conn
+    finally:
+        if trace is not None:
+            conn.set_trace_callback(None)
+        _release(conn)
+
+
+@contextmanager
+def transaction():
+    # One logical action = one commit. Nested transaction() calls join the outer one.
+    active = getattr(_local, "conn", None)
+    if active is not None:
+        yield active.cursor()
+        return
+
+    with connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")  # take the write lock up front, busy_timeout handles waiting
+        _local.conn = conn
+        try:
+            yield conn.cursor()
+            conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            _local.conn = None
@@ -0,0 +1,61 @@
+import io
+import json
+import importlib.util
+
+# =============================
+# List exports
+# =============================
+# Exports are built in memory when a download is requested, never written to the working
+# directory, so concurrent users can't overwrite each other's files. Parquet needs pyarrow
+# (or fastparquet) and is only offered when one of them is installed.
+
+EXPORT_COLUMNS = ["List Name", "Name", "Type", "Latitude", "Longitude"]
+EXPORT_FORMATS = {
+    # label -> (file extension, mime type)
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "GeoJSON": ("geojson", "application/geo+json"),
+}
+
+
+def available_formats():
+    has_parquet = any(importlib.util.find_spec(engine) for engine in ("pyarrow", "fastparquet"))
+    return [label for label in EXPORT_FORMATS if label != "Parquet" or has_parquet]
+
+
+def export_file_name(base_name, export_format):
+    return f"{base_name}.{EXPORT_FORMATS[export_format][0]}"
+
+
+def export_mime(export_format):
+    return EXPORT_FORMATS[export_format][1]
+
+
+def locations_geojson(rows):
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": {"list": list_name, "name": name, "type": loc_type},
+            }
+            for list_name, name, loc_type, lat, lon in rows
+        ],
+    }
+
+
+def export_locations(rows, export_format):
+    # rows: (list name, spot name, type, latitude, longitude) tuples -> file contents as bytes
+    if export_format == "GeoJSON":
+        return json.dumps(locations_geojson(rows), ensure_ascii=False).encode("utf-8")
+    import pandas as pd  # only the table formats need it, and only when a download is built
+    frame = pd.DataFrame(rows, columns=EXPORT_COLUMNS)
+    buffer = io.BytesIO()
+    if export_format == "Parquet":
+        frame.to_parquet(buffer, index=False)
+    elif export_format == "CSV":
+        frame.to_csv(buffer, index=False, encoding="utf-8")
+    else:
+        raise ValueError(f"Unknown export format: {export_format}")
+    return buffer.getvalue()
@@ -0,0 +1,145 @@
+import json
+import time
+import logging
+import functools
+import threading
+from contextlib import nullcontext
+import database
+
+# =============================
+# Per-rerun profiling
+# =============================
+# Every script thread records one "run" at a time: inclusive wall time and SQL statement count
+# per named span (the page, a data-layer function), plus the total statement count seen
+# by the SQLite trace callback. Without an active run span() returns a shared no-op context
+# and @timed functions are called straight through, so the instrumentation costs one
+# thread-local lookup per call when profiling is off.
+
+logger = logging.getLogger("spoton.profile")
+
+
+class _State(threading.local):
+    run = None  # class default: reading it on a fresh thread needs no AttributeError
+
+
+_local = _State()
+_NULL_SPAN = nullcontext()
+
+
+class Run:
+    __slots__ = ("started", "spans", "stack", "queries", "statements")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = {}  # name -> [calls, seconds, queries]
+        self.stack = []  # names of the open spans, innermost last
+        self.queries = 0
+        self.statements = {}  # first keyword of the statement -> count
+
+    def _stats(self, name):
+        stats = self.spans.get(name)
+        if stats is None:
+            stats = self.spans[name] = [0, 0.0, 0]
+        return stats
+
+    def to_dict(self):
+        return {
+            "event": "rerun",
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "queries": self.queries,
+            "statements": self.statements,
+            "spans": [
+                {"name": name, "calls": calls, "ms": round(seconds * 1000, 2), "queries": queries}
+                for name, (calls, seconds, queries) in sorted(self.spans.items(), key=lambda item: -item[1][1])
+            ],
+        }
+
+
+class _Span:
+    __slots__ = ("run", "name", "start")
+
+    def __init__(self, run, name):
+        self.run = run
+        self.name = name
+
+    def __enter__(self):
+        self.run.stack.append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        self.run.stack.pop()
+        stats = self.run._stats(self.name)
+        stats[0] += 1
+        stats[1] += elapsed
+        return False
+
+
+def _on_statement(statement):
+    # sqlite3 trace callback, called on the thread that runs the statement
+    run = _local.run
+    if run is None:
+        return
+    run.queries += 1
+    parts = statement.split(None, 1)
+    keyword = parts[0].upper() if parts else ""
+    run.statements[keyword] = run.statements.get(keyword, 0) + 1
+    if run.stack:
+        run._stats(run.stack[-1])[2] += 1
+
+
+def enable():
+    # Count SQL statements from now on and write run records as JSON lines to stderr
+    database.set_trace_callback(_on_statement)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def disable():
+    database.set_trace_callback(None)
+
+
+def start_run():
+    # Begin recording on this thread; a run left open by an aborted rerun is discarded
+    _local.run = Run()
+    return _local.run
+
+
+def finish_run():
+    # Stop recording on this thread -> the run as a dict (also logged as one JSON line), or None
+    run = _local.run
+    _local.run = None
+    if run is None:
+        return None
+    record = run.to_dict()
+    logger.info(json.dumps(record))
+    return record
+
+
+def span(name):
+    run = _local.run
+    if run is None:
+        return _NULL_SPAN
+    return _Span(run, name)
+
+
+def timed(fn=None, *, name=None):
+    # Decorator: every call of fn is a span named after the function
+    if fn is None:
+        return functools.partial(timed, name=name)
+    label = name or fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        run = _local.run
+        if run is None:
+            return fn(*args, **kwargs)
+        with _Span(run, label):
+            return fn(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,104 @@
+import threading
+import numpy as np
+import database
+from database import transaction
+from catalog import load_spots, files_fingerprint
+from instrumentation import timed
+
+# =============================
+# Stable location ids
+# =============================
+# Every catalog spot gets an integer id from the locations table, keyed by (name, type), so the
+# id survives edits and reordering of the CSV. Lists store these ids instead of copies of the
+# spot. The LocationIndex maps ids to catalog rows with plain dicts, cached per catalog version
+# and database like the other catalog caches.
+
+_cache = {}  # (path or catalog source, sep, database) -> (catalog fingerprint, LocationIndex)
+_cache_lock = threading.Lock()
+
+
+class LocationIndex:
+    def __init__(self, spots, ids):
+        self.spots = spots  # catalog.SpotColumns
+        self.ids = ids  # id of catalog row i
+        # first catalog row of every id; later rows with the same name and type are duplicates
+        self.positions = {}
+        for position, location_id in enumerate(ids.tolist()):
+            self.positions.setdefault(location_id, position)
+        self.labels = {
+            location_id: f"{self.spots.names[self.spots.name_codes[position]]} ({self.spots.types[self.spots.type_codes[position]]})"
+            for location_id, position in self.positions.items()
+        }
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, location_id):
+        return location_id in self.positions
+
+    def label(self, location_id):
+        return self.labels.get(location_id, f"#{location_id}")
+
+    def location(self, location_id):
+        position = self.positions[location_id]
+        spots = self.spots
+        return {
+            "id": location_id,
+            "name": spots.names[spots.name_codes[position]],
+            "type": spots.types[spots.type_codes[position]],
+            "latitude": float(spots.latitude[position]),
+            "longitude": float(spots.longitude[position]),
+        }
+
+    def locations(self, location_ids):
+        # List entries for the given ids; ids that are not in the catalog are skipped
+        return [self.location(location_id) for location_id in location_ids if location_id in self.positions]
+
+
+@timed
+def sync_locations(spots):
+    # Insert new catalog spots into the locations table (coordinates follow the CSV) -> id per row
+    names = spots.name_array().tolist()
+    types = spots.type_array().tolist()
+    rows = {}
+    for name, spot_type, lat, lon in zip(names, types, spots.latitude.tolist(), spots.longitude.tolist()):
+        rows.setdefault((name, spot_type), (lat, lon))
+    with transaction() as cursor:
+        cursor.executemany("""
+            INSERT INTO locations (name, type, latitude, longitude) VALUES (?, ?, ?, ?)
+            ON CONFLICT (name, type) DO UPDATE SET latitude = excluded.latitude, longitude = excluded.longitude
+            WHERE latitude != excluded.latitude OR longitude != excluded.longitude
+        """, [key + coordinates for key, coordinates in rows.items()])
+        known = {(name, spot_type): location_id
+                 for location_id, name, spot_type in cursor.execute("SELECT id, name, type FROM locations")}
+    return np.fromiter((known[key] for key in zip(names, types)), dtype=np.int64, count=len(names))
+
+
+def _cached_index(key, fingerprint, load):
+    cached = _cache.get(key)
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+        spots = load()
+        index = LocationIndex(spots, sync_locations(spots))
+        _cache[key] = (fingerprint, index)
+        return index
+
+
+def get_location_index(file_path, sep=None):
+    # LocationIndex of a catalog CSV; raises like catalog.load_spots()
+    return _cached_index((file_path, sep, database.DB_PATH), files_fingerprint([file_path]),
+                         lambda: load_spots(file_path, sep=sep))
+
+
+def get_catalog_location_index(catalog):
+    # LocationIndex over all files of a catalog_dir.CatalogSet, positions match catalog.spots
+    return _cached_index((catalog.source, database.DB_PATH), catalog.fingerprint, lambda: catalog.spots)
+
+
+def clear_location_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+
+# =============================
+# In-process LRU cache
+# =============================
+# The one least-recently-used cache behind the module-level caches (routes, map layers,
+# profile thumbnails, chart PNGs). Thread-safe, shared by all sessions of the process. Bounded
+# by entry count, or by the summed size_of(value) of its entries, e.g. bytes; the newest entry
+# is always kept, even when it is larger than the bound on its own. get_or_build() runs build()
+# outside the lock, so two sessions missing the same key at once may both build it.
+
+
+class LRUCache:
+    def __init__(self, max_size, size_of=None):
+        self.max_size = max_size
+        self._size_of = size_of
+        self._entries = OrderedDict()  # key -> value, oldest first
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _entry_size(self, value):
+        return 1 if self._size_of is None else self._size_of(value)
+
+    def get(self, key):
+        # -> cached value (now the most recently used) or None
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        # An entry already cached under key is kept (and returned), as concurrent builds are equal
+        with self._lock:
+            if key in self._entries:
+                value = self._entries[key]
+            else:
+                self._entries[key] = value
+                self._size += self._entry_size(value)
+            self._entries.move_to_end(key)
+            while self._size > self.max_size and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= self._entry_size(evicted)
+            return value
+
+    def get_or_build(self, key, build):
+        # Cached value for key; build() makes it on a miss (None results are not cached)
+        value = self.get(key)
+        if value is None:
+            value = build()
+            if value is not None:
+                value = self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
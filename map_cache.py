@@ -0,0 +1,29 @@
+import hashlib
+from lru import LRUCache
+from map_layers import copy_map
+from instrumentation import timed
+
+# =============================
+# Cache for the Map tab's folium map
+# =============================
+# The map is assembled from pre-rendered layers (map_layers.add_cached_layer), but assembling
+# it still reads every user list from the database and hashes each one into its layer key.
+# The assembled map is kept per cache key (catalog fingerprint, lists_version and the view
+# settings) in an LRU shared by all sessions, so a rerun that changed none of them skips both.
+# st_folium() renames the elements of the map it is given, so a map can only be shown once:
+# every rerun gets its own copy (map_layers.copy_map, which shares the rendered layer strings)
+# and st_folium serializes that as usual.
+
+MAP_CACHE_SIZE = 16
+
+_cache = LRUCache(MAP_CACHE_SIZE)  # cache key -> folium.Map, never passed to st_folium itself
+
+
+def map_cache_key(*parts):
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+@timed
+def get_map(key, build):
+    # A copy of the map cached under key, to be shown with st_folium(); build() creates it on a miss
+    return copy_map(_cache.get_or_build(key, build))
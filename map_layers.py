@@ -0,0 +1,212 @@
+import copy
+import json
+import html
+import hashlib
+from collections import OrderedDict
+import folium
+from folium.map import Layer
+from folium.elements import JSCSSMixin
+from folium.plugins import FastMarkerCluster
+from branca.element import Figure, MacroElement, JavascriptLink, CssLink
+from jinja2 import Template
+from instrumentation import timed
+from lru import LRUCache
+
+# =============================
+# Spot layers for the folium map
+# =============================
+# "markers" - one folium.Marker (own icon, popup and JS block) per spot, the original output
+# "geojson" - one GeoJSON FeatureCollection per feature group, styled and bound to popups in the browser
+# "cluster" - compact [lat, lon, name, type] rows that the browser turns into clustered markers
+
+RENDER_MODES = ["markers", "geojson", "cluster"]
+ICON_COLORS = {
+    'Nightclub': 'red',
+    'Bar': 'blue',
+    'Restaurant': 'green'
+}
+DEFAULT_ICON_COLOR = 'gray'
+COORDINATE_DECIMALS = 6  # ~0.1 m, keeps the payload small
+
+MAP_ID = "spoton"  # fixed id of the map, so pre-rendered layers can refer to it
+LAYER_CACHE_BYTES = 128 * 1024 * 1024  # bounded by size, a map can easily have thousands of small list layers
+
+_layer_cache = LRUCache(LAYER_CACHE_BYTES, size_of=lambda layer: layer.size())  # key -> CachedLayer fragment
+
+
+def get_icon_color(location_type):
+    return ICON_COLORS.get(location_type, DEFAULT_ICON_COLOR)
+
+
+def spots_feature_collection(names, types, latitudes, longitudes):
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [round(lon, COORDINATE_DECIMALS), round(lat, COORDINATE_DECIMALS)]},
+                "properties": {"name": html.escape(str(name)), "type": html.escape(str(spot_type))},
+            }
+            for name, spot_type, lat, lon in zip(names, types, latitudes, longitudes)
+        ],
+    }
+
+
+class SpotGeoJson(MacroElement):
+    # L.geoJSON layer whose circle markers take their colour from ICON_COLORS client-side,
+    # so no per-spot icon, style or popup object is serialized
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }}_colors = {{ this.colors|tojson }};
+        var {{ this.get_name() }} = L.geoJSON({{ this.data|tojson }}, {
+            pointToLayer: function (feature, latlng) {
+                var color = {{ this.get_name() }}_colors[feature.properties.type] || {{ this.default_color|tojson }};
+                return L.circleMarker(latlng, {radius: 7, weight: 1, color: color, fillColor: color, fillOpacity: 0.8});
+            },
+            onEachFeature: function (feature, layer) {
+                layer.bindPopup(feature.properties.name + " (" + feature.properties.type + ")");
+            }
+        }).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+
+    def __init__(self, data):
+        super().__init__()
+        self._name = "SpotGeoJson"
+        self.data = data
+        self.colors = ICON_COLORS
+        self.default_color = DEFAULT_ICON_COLOR
+
+
+CLUSTER_CALLBACK = """
+    function (row) {
+        var colors = %s;
+        var color = colors[row[3]] || %s;
+        var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {radius: 7, weight: 1, color: color, fillColor: color, fillOpacity: 0.8});
+        marker.bindPopup(row[2] + " (" + row[3] + ")");
+        return marker;
+    }
+""" % (json.dumps(ICON_COLORS), json.dumps(DEFAULT_ICON_COLOR))
+
+
+def add_spots(parent, names, types, latitudes, longitudes, mode="markers"):
+    # Add spots to a folium Map/FeatureGroup in one of RENDER_MODES
+    if mode == "geojson":
+        SpotGeoJson(spots_feature_collection(names, types, latitudes, longitudes)).add_to(parent)
+    elif mode == "cluster":
+        rows = [
+            [round(lat, COORDINATE_DECIMALS), round(lon, COORDINATE_DECIMALS), html.escape(str(name)), html.escape(str(spot_type))]
+            for name, spot_type, lat, lon in zip(names, types, latitudes, longitudes)
+        ]
+        if rows:
+            FastMarkerCluster(rows, callback=CLUSTER_CALLBACK, control=False).add_to(parent)
+    else:
+        for name, spot_type, lat, lon in zip(names, types, latitudes, longitudes):
+            folium.Marker(
+                [lat, lon],
+                popup=f"{name} ({spot_type})",
+                icon=folium.Icon(color=get_icon_color(spot_type)),
+            ).add_to(parent)
+
+
+# =============================
+# Per-layer render cache
+# =============================
+# Every feature group (one per base CSV, one per user list) is rendered to its leaflet JS once
+# and cached under a hash of its own content. A map is then assembled from these fragments,
+# so editing one list re-renders only that list's layer.
+
+def create_base_map(location, zoom):
+    map_obj = folium.Map(location=location, zoom_start=zoom)
+    map_obj._id = MAP_ID
+    return map_obj
+
+
+def layer_key(*parts):
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+class CachedLayer(JSCSSMixin, Layer):
+    # A pre-rendered FeatureGroup. Being a Layer it still shows up in the LayerControl.
+    _template = Template("""
+        {% macro header(this, kwargs) %}{{ this.header_html }}{% endmacro %}
+        {% macro script(this, kwargs) %}{{ this.script_js }}{% endmacro %}
+    """)
+
+    def __init__(self, name, layer_id, script_js, header_html="", default_js=None, default_css=None):
+        super().__init__(name=name, overlay=True, control=True, show=True)
+        self._name = "FeatureGroup"
+        self._id = layer_id
+        self.script_js = script_js
+        self.header_html = header_html
+        self.default_js = default_js or []
+        self.default_css = default_css or []
+
+    def size(self):
+        return len(self.script_js) + len(self.header_html)
+
+    def copy(self):
+        # a fresh element per map, the rendered strings are shared
+        layer = copy.copy(self)
+        layer._children = OrderedDict()
+        layer._parent = None
+        return layer
+
+
+def _subtree(element):
+    yield element
+    for child in element._children.values():
+        yield from _subtree(child)
+
+
+@timed
+def render_layer(feature_group):
+    # Render a FeatureGroup (and everything in it) on its own into a CachedLayer
+    figure = Figure()
+    host = create_base_map([0, 0], 1)
+    figure.add_child(host)
+    feature_group.add_to(host)
+    feature_group.render()
+
+    # newer folium adds a layer to its parent with a separate statement (a child of the layer);
+    # the CachedLayer emits its own in the real map, so the one for the throwaway host is left out
+    host_add_to = {child.get_name() for child in feature_group._children.values()
+                   if getattr(child, "element_name", None) == feature_group.get_name()}
+    script_js = "\n".join(element.render() for name, element in figure.script._children.items()
+                          if name not in host_add_to)
+    header_html = "\n".join(
+        element.render() for element in figure.header._children.values()
+        if not isinstance(element, (JavascriptLink, CssLink))
+    )
+    default_js, default_css = [], []
+    for element in _subtree(feature_group):
+        if isinstance(element, JSCSSMixin):
+            default_js.extend(item for item in element.default_js if item not in default_js)
+            default_css.extend(item for item in element.default_css if item not in default_css)
+    return CachedLayer(feature_group.layer_name, feature_group._id, script_js, header_html, default_js, default_css)
+
+
+def add_cached_layer(map_obj, key, build):
+    # Add the layer cached under key to map_obj; build() returns the FeatureGroup on a miss
+    # (or None when there is nothing to show, which is not cached)
+    def build_layer():
+        feature_group = build()
+        return render_layer(feature_group) if feature_group is not None else None
+
+    layer = _layer_cache.get_or_build(key, build_layer)
+    return layer.copy().add_to(map_obj) if layer is not None else None
+
+
+def copy_map(map_obj):
+    # Deep copy of a map assembled with add_cached_layer(); its pre-rendered layers are copied
+    # with CachedLayer.copy(), so the rendered strings are shared instead of walked
+    layers = [child for child in map_obj._children.values() if isinstance(child, CachedLayer)]
+    memo = {id(layer): layer.copy() for layer in layers}
+    map_copy = copy.deepcopy(map_obj, memo)
+    for layer in layers:
+        memo[id(layer)]._parent = map_copy
+    return map_copy
+
+
+def clear_layer_cache():
+    _layer_cache.clear()
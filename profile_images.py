@@ -0,0 +1,98 @@
+import io
+import os
+import re
+import hashlib
+import threading
+from PIL import Image, ImageOps, UnidentifiedImageError
+from instrumentation import timed
+from lru import LRUCache
+
+# =============================
+# Profile pictures
+# =============================
+# Uploads are normalized once, when they are uploaded: EXIF rotation applied, scaled down to a
+# thumbnail and re-encoded as JPEG. The result is stored under its SHA-256, so the same picture
+# is stored once and never overwritten by another upload. Pages read thumbnails through a small
+# in-process byte cache instead of opening full-size files on every rerun.
+
+UPLOAD_FOLDER = "uploaded_images"
+IMAGE_TYPES = ["png", "jpg", "jpeg", "webp", "gif", "bmp"]
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+MAX_IMAGE_PIXELS = 40_000_000  # larger images are refused before being decoded
+THUMBNAIL_SIZE = 256  # longest side in px; shown at 100 px, sharp on high-density screens
+JPEG_QUALITY = 85
+THUMBNAIL_CACHE_BYTES = 16 * 1024 * 1024
+
+_STORED_NAME = re.compile(r"^[0-9a-f]{64}\.jpg$")
+_NOT_AN_IMAGE = b""  # cache entry of a file that is not a usable image
+
+_cache = LRUCache(THUMBNAIL_CACHE_BYTES, size_of=len)  # (path, mtime_ns, size) -> thumbnail bytes
+
+
+@timed
+def make_thumbnail(data):
+    # Image file contents -> JPEG thumbnail bytes; ValueError when it is too large or not an image
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise ValueError(f"Image is too large (max. {MAX_UPLOAD_BYTES // (1024 * 1024)} MB).")
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width * image.height > MAX_IMAGE_PIXELS:
+                raise ValueError("Image dimensions are too large.")
+            image.draft("RGB", (THUMBNAIL_SIZE, THUMBNAIL_SIZE))  # JPEG: decode at reduced size
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, "white")
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            else:
+                image = image.convert("RGB")
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise ValueError("The uploaded file is not a supported image.") from e
+    return buffer.getvalue()
+
+
+def store_profile_image(data, folder=UPLOAD_FOLDER):
+    # Normalize an upload and store it content-addressed -> path to save in users.profile_image
+    thumbnail = make_thumbnail(data)
+    path = os.path.join(folder, hashlib.sha256(thumbnail).hexdigest() + ".jpg")
+    if not os.path.exists(path):
+        os.makedirs(folder, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(thumbnail)
+        os.replace(temp_path, path)  # readers never see a half-written file
+    return path
+
+
+def get_thumbnail(path):
+    # Thumbnail bytes of a stored profile picture, None when there is none. Pictures stored
+    # before uploads were normalized are scaled down here, once per process.
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    thumbnail = _cache.get_or_build((path, stat.st_mtime_ns, stat.st_size), lambda: _read_thumbnail(path))
+    return thumbnail if thumbnail != _NOT_AN_IMAGE else None
+
+
+def _read_thumbnail(path):
+    # -> thumbnail bytes, or _NOT_AN_IMAGE, which is cached like a thumbnail so that a legacy
+    # file that can't be decoded isn't read again on every rerun (until it changes)
+    with open(path, "rb") as f:
+        data = f.read()
+    if _STORED_NAME.match(os.path.basename(path)):
+        return data
+    try:
+        return make_thumbnail(data)
+    except ValueError:
+        return _NOT_AN_IMAGE
+
+
+def clear_thumbnail_cache():
+    _cache.clear()
@@ -0,0 +1,214 @@
+import sys
+import time
+import threading
+import numpy as np
+from database import connection, transaction
+from instrumentation import timed
+
+# =============================
+# List recommendations
+# =============================
+# "Recommended for you": lists liked by the users with the most similar taste. Two users are
+# similar when they like the same lists (cosine of the sparse user x list like matrix) and
+# picked the same activities (cosine of the user x activity matrix). A user's candidates are
+# the lists their NEIGHBOURS most similar users like, weighted by similarity, without their
+# own lists and those they already like. All users are computed in one numpy batch, a block of
+# users at a time, and the top lists are written to the recommendations table, so serving one
+# user reads RECOMMENDATIONS_SIZE rows of its primary key. Likes, new users and changed
+# activities bump the recommendation_inputs counter (triggers in service.SCHEMA); when the
+# stored batch is older, refresh_if_stale() builds a new one on a background thread and pages
+# keep showing the stored one until it is committed.
+#   python recommendations.py     rebuilds the recommendations once, e.g. from cron
+
+RECOMMENDATIONS_SIZE = 10  # lists stored (and shown) per user
+NEIGHBOURS = 50  # most similar users whose likes make up a user's recommendations
+LIKE_WEIGHT = 0.7  # similarity = LIKE_WEIGHT * likes cosine + (1 - LIKE_WEIGHT) * activities cosine
+BLOCK_FLOATS = 4_000_000  # about 16 MB per block of similarity and score rows
+REFRESH_INTERVAL_S = 30.0  # a burst of likes starts at most one batch per interval
+
+_refresh_lock = threading.Lock()
+_refresh_thread = None
+_last_refresh = 0.0
+
+
+def _unit_weights(rows, n_rows):
+    # weight of every entry of a 0/1 matrix given by its row indexes so that each row has length 1
+    counts = np.bincount(rows, minlength=n_rows)
+    return (1.0 / np.sqrt(np.maximum(counts, 1)))[rows].astype(np.float32)
+
+
+def _times_sparse(dense, index, values, columns, n_columns):
+    # dense (b x n) @ S, S (n x n_columns) given as entries (row index, value, column) sorted by
+    # column -> dense b x n_columns; one gather and one reduceat, no Python loop over entries
+    out = np.zeros((dense.shape[0], n_columns), dtype=np.float32)
+    if len(index):
+        starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+        out[:, columns[starts]] = np.add.reduceat(dense[:, index] * values, starts, axis=1)
+    return out
+
+
+def _top_per_row(matrix, k):
+    # -> column indexes of the k largest values of every row, largest first
+    if matrix.shape[1] > k:
+        top = np.argpartition(-matrix, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(matrix.shape[1]), matrix.shape)
+    order = np.argsort(-np.take_along_axis(matrix, top, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1)
+
+
+@timed
+def compute_recommendations(n_users, like_users, like_lists, user_activities, list_owners, k=RECOMMENDATIONS_SIZE):
+    # Users and lists are indexes 0..n-1. like_users/like_lists: one entry per like;
+    # user_activities: activity names per user; list_owners: owner index per list (-1: none).
+    # -> (user, rank, list, score) arrays of every user's top k lists with a score above 0
+    like_users = np.asarray(like_users, dtype=np.int64)
+    like_lists = np.asarray(like_lists, dtype=np.int64)
+    list_owners = np.asarray(list_owners, dtype=np.int64)
+    empty = np.empty(0, dtype=np.int64)
+    if not n_users or not len(like_users):
+        return empty, empty, empty, np.empty(0, dtype=np.float32)
+
+    # only lists with at least one like can be recommended; columns are those lists
+    liked, like_columns = np.unique(like_lists, return_inverse=True)
+    like_columns = like_columns.reshape(-1)
+    liked_owners = list_owners[liked]
+    like_weights = _unit_weights(like_users, n_users)
+
+    by_user = np.argsort(like_users, kind="stable")  # entries of the transposed like matrix
+    by_list = np.argsort(like_columns, kind="stable")  # entries of the like matrix
+    user_starts = np.searchsorted(like_users[by_user], np.arange(n_users + 1))
+
+    vocabulary = {activity: i for i, activity in enumerate(sorted({a for acts in user_activities for a in acts}))}
+    pairs = [(u, vocabulary[a]) for u, acts in enumerate(user_activities) for a in set(acts)]
+    activity_users = np.array([u for u, _ in pairs], dtype=np.int64)
+    activity_columns = np.array([a for _, a in pairs], dtype=np.int64)
+    activities = np.zeros((n_users, len(vocabulary)), dtype=np.float32)
+    activities[activity_users, activity_columns] = _unit_weights(activity_users, n_users)
+
+    n_liked = len(liked)
+    block = max(1, BLOCK_FLOATS // max(n_users, n_liked, len(like_users)))
+    results = []
+    for start in range(0, n_users, block):
+        stop = min(start + block, n_users)
+        rows = np.arange(stop - start)
+        entries = by_user[user_starts[start]:user_starts[stop]]
+
+        user_likes = np.zeros((stop - start, n_liked), dtype=np.float32)
+        user_likes[like_users[entries] - start, like_columns[entries]] = like_weights[entries]
+        similarity = LIKE_WEIGHT * _times_sparse(
+            user_likes, like_columns[by_user], like_weights[by_user], like_users[by_user], n_users)
+        similarity += (1 - LIKE_WEIGHT) * (activities[start:stop] @ activities.T)
+        similarity[rows, rows + start] = 0.0  # a user is not their own neighbour
+        if n_users > NEIGHBOURS:
+            neighbours = np.argpartition(-similarity, NEIGHBOURS - 1, axis=1)[:, :NEIGHBOURS]
+            kept = np.zeros_like(similarity)
+            np.put_along_axis(kept, neighbours, np.take_along_axis(similarity, neighbours, axis=1), axis=1)
+            similarity = kept
+
+        scores = _times_sparse(similarity, like_users[by_list], np.float32(1.0), like_columns[by_list], n_liked)
+        scores[like_users[entries] - start, like_columns[entries]] = 0.0  # already liked
+        owned = (liked_owners >= start) & (liked_owners < stop)
+        scores[liked_owners[owned] - start, np.flatnonzero(owned)] = 0.0  # their own lists
+
+        top = _top_per_row(scores, k)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        users, ranks = np.nonzero(top_scores > 0)
+        results.append((users + start, ranks, liked[top[users, ranks]], top_scores[users, ranks]))
+
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+def _read_inputs(conn):
+    # Counter, users, likes and list owners from one snapshot of the database
+    conn.execute("BEGIN")
+    try:
+        version = conn.execute("SELECT value FROM counters WHERE name = 'recommendation_inputs'").fetchone()
+        users = conn.execute("SELECT username, activities FROM users ORDER BY rowid").fetchall()
+        likes = conn.execute("SELECT username, list_id FROM likes").fetchall()
+        lists = conn.execute("SELECT id, owner FROM lists ORDER BY id").fetchall()
+    finally:
+        conn.execute("COMMIT")
+    return (version[0] if version else 0), users, likes, lists
+
+
+@timed
+def refresh_recommendations():
+    # Recompute every user's recommendations and replace the stored ones -> rows written
+    with connection() as conn:
+        version, users, likes, lists = _read_inputs(conn)
+    usernames = [username for username, _ in users]
+    user_index = {username: i for i, username in enumerate(usernames)}
+    list_ids = [list_id for list_id, _ in lists]
+    list_index = {list_id: i for i, list_id in enumerate(list_ids)}
+    likes = [(user_index[username], list_index[list_id]) for username, list_id in likes
+             if username in user_index and list_id in list_index]
+
+    users_of, ranks, lists_of, scores = compute_recommendations(
+        len(usernames),
+        [u for u, _ in likes], [l for _, l in likes],
+        [[a for a in (activities or "").split(",") if a] for _, activities in users],
+        [user_index.get(owner, -1) for _, owner in lists],
+    )
+    rows = [(usernames[u], rank, list_ids[l], score) for u, rank, l, score
+            in zip(users_of.tolist(), ranks.tolist(), lists_of.tolist(), scores.tolist())]
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM recommendations")
+        # users and lists deleted while the batch was computed are skipped
+        cursor.executemany("""
+            INSERT INTO recommendations (username, rank, list_id, score)
+            SELECT ?1, ?2, ?3, ?4 WHERE EXISTS (SELECT 1 FROM users WHERE username = ?1)
+                                    AND EXISTS (SELECT 1 FROM lists WHERE id = ?3)
+        """, rows)
+        cursor.execute("UPDATE counters SET value = ? WHERE name = 'recommendations_built'", (version,))
+    return len(rows)
+
+
+def is_stale():
+    # True when likes or activities changed since the stored recommendations were built
+    with connection() as conn:
+        counters = dict(conn.execute(
+            "SELECT name, value FROM counters WHERE name IN ('recommendation_inputs', 'recommendations_built')"
+        ).fetchall())
+    return counters.get("recommendations_built") != counters.get("recommendation_inputs", 0)
+
+
+def refresh_if_stale():
+    # Start refresh_recommendations() on a background thread when the stored ones are stale;
+    # returns at once. One batch at a time per process, at most one per REFRESH_INTERVAL_S.
+    global _refresh_thread, _last_refresh
+    with _refresh_lock:
+        if _refresh_thread is not None and _refresh_thread.is_alive():
+            return False
+        if time.monotonic() - _last_refresh < REFRESH_INTERVAL_S or not is_stale():
+            return False
+        _last_refresh = time.monotonic()
+        _refresh_thread = threading.Thread(target=refresh_recommendations, name="recommendations", daemon=True)
+        _refresh_thread.start()
+        return True
+
+
+@timed
+def get_recommendations(username, k=RECOMMENDATIONS_SIZE):
+    # -> rows shaped like service.get_list_page(), best first, from the last batch. Lists the
+    # user liked since then, and lists shadowed by a newer one with the same name, are left out.
+    with connection() as conn:
+        return conn.execute("""
+            SELECT l.id, l.name, l.owner, l.likes,
+                   (SELECT COUNT(*) FROM list_items li WHERE li.list_id = l.id)
+            FROM recommendations r JOIN lists l ON l.id = r.list_id
+            WHERE r.username = ?
+              AND NOT EXISTS (SELECT 1 FROM likes k WHERE k.username = r.username AND k.list_id = r.list_id)
+              AND NOT EXISTS (SELECT 1 FROM lists n WHERE n.name = l.name AND n.id > l.id)
+            ORDER BY r.rank LIMIT ?
+        """, (username, k)).fetchall()
+
+
+if __name__ == "__main__":
+    import database
+    from service import ensure_db
+    if len(sys.argv) > 1:
+        database.configure(sys.argv[1])
+    ensure_db()
+    start = time.perf_counter()
+    print(f"{refresh_recommendations()} recommendations in {time.perf_counter() - start:.2f} s")
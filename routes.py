@@ -0,0 +1,149 @@
+import json
+import hashlib
+import numpy as np
+from spatial_index import haversine_m
+from instrumentation import timed
+from lru import LRUCache
+
+# =============================
+# Walking routes through a list
+# =============================
+# A list's spots in the order that makes the shortest walk from the first to the last stop
+# (an open-path travelling salesman problem, distances as the crow flies). The haversine
+# distance matrix is built in one vectorized step. An extra "anywhere" stop at distance 0 from
+# every spot turns the open path into a closed tour, so the improvement moves need no special
+# cases for the two ends. Nearest-neighbour tours from a few starting spots are improved with
+# 2-opt (reverse a stretch) and Or-opt (move 1-3 consecutive stops elsewhere, either way
+# round) until neither shortens the walk, each move scanning all positions with numpy at once.
+# Routes are cached by a hash of the list's spots, with least-recently-used eviction.
+
+ROUTE_STARTS = 4  # nearest-neighbour starts tried (from the outermost spots), the shortest wins
+OR_OPT_SEGMENTS = (1, 2, 3)  # lengths of the stretches Or-opt moves
+ROUTE_CACHE_SIZE = 256
+MIN_GAIN_M = 1e-6  # smaller improvements are rounding noise
+
+_cache = LRUCache(ROUTE_CACHE_SIZE)  # content hash -> Route
+
+
+class Route:
+    __slots__ = ("order", "legs_m", "length_m")
+
+    def __init__(self, order, legs_m):
+        self.order = order  # positions in the given spots, in walking order
+        self.legs_m = legs_m  # metres from each stop to the next, len(order) - 1 entries
+        self.length_m = float(sum(legs_m))
+
+
+def distance_matrix(latitudes, longitudes):
+    # -> n x n metres between every pair of spots
+    lat = np.asarray(latitudes, dtype=np.float64)
+    lon = np.asarray(longitudes, dtype=np.float64)
+    return haversine_m(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+
+
+def _tour_length(tour, dist):
+    return float(dist[tour, np.roll(tour, -1)].sum())
+
+
+def _nearest_neighbour(dist, start):
+    # Open path from start, always on to the closest spot not visited yet
+    n = len(dist)
+    visited = np.zeros(n, dtype=bool)
+    path = np.empty(n, dtype=np.int64)
+    path[0], visited[start] = start, True
+    for step in range(1, n):
+        row = np.where(visited, np.inf, dist[path[step - 1]])
+        path[step] = np.argmin(row)
+        visited[path[step]] = True
+    return path
+
+
+def _two_opt(tour, dist):
+    # Reverse tour[i..j] while that shortens the closed tour; tour[0] stays in place -> improved?
+    m = len(tour)
+    improved = False
+    for i in range(1, m - 1):
+        a, b = tour[i - 1], tour[i]
+        c = tour[i + 1:]
+        d = np.append(tour[i + 2:], tour[0])
+        gain = dist[a, b] + dist[c, d] - dist[a, c] - dist[b, d]
+        best = int(np.argmax(gain))
+        if gain[best] > MIN_GAIN_M:
+            j = i + 1 + best
+            tour[i:j + 1] = tour[i:j + 1][::-1].copy()
+            improved = True
+    return improved
+
+
+def _or_opt(tour, dist):
+    # Move a stretch of 1-3 stops to the edge where it adds the least, possibly reversed;
+    # tour[0] stays in place -> (tour, improved?)
+    improved = False
+    for length in OR_OPT_SEGMENTS:
+        i = 1
+        while i + length <= len(tour) and len(tour) - length >= 3:
+            first, last = tour[i], tour[i + length - 1]
+            before, after = tour[i - 1], tour[(i + length) % len(tour)]
+            removed = dist[before, first] + dist[last, after] - dist[before, after]
+            rest = np.concatenate([tour[:i], tour[i + length:]])
+            u, v = rest, np.roll(rest, -1)
+            forward = dist[u, first] + dist[last, v] - dist[u, v]
+            backward = dist[u, last] + dist[first, v] - dist[u, v]
+            forward[i - 1] = backward[i - 1] = np.inf  # the edge it was taken from
+            k_forward, k_backward = int(np.argmin(forward)), int(np.argmin(backward))
+            if min(forward[k_forward], backward[k_backward]) < removed - MIN_GAIN_M:
+                segment = tour[i:i + length]
+                if forward[k_forward] <= backward[k_backward]:
+                    k = k_forward
+                else:
+                    k, segment = k_backward, segment[::-1]
+                tour = np.concatenate([rest[:k + 1], segment, rest[k + 1:]])
+                improved = True
+            else:
+                i += 1
+    return tour, improved
+
+
+@timed
+def solve_route(latitudes, longitudes):
+    # Shortest open walk through all spots found by the heuristics above -> Route
+    n = len(latitudes)
+    if n < 3:
+        dist = distance_matrix(latitudes, longitudes)
+        return Route(list(range(n)), [float(dist[0, 1])] if n == 2 else [])
+    # spot n is the "anywhere" stop, tours start there and the path is the rest of the tour
+    dist = np.zeros((n + 1, n + 1))
+    dist[:n, :n] = distance_matrix(latitudes, longitudes)
+    lat, lon = np.asarray(latitudes, dtype=np.float64), np.asarray(longitudes, dtype=np.float64)
+    starts = list(dict.fromkeys(int(i) for i in (lat.argmin(), lat.argmax(), lon.argmin(), lon.argmax())))
+
+    best, best_length = None, np.inf
+    for start in starts[:ROUTE_STARTS]:
+        tour = np.concatenate([[n], _nearest_neighbour(dist[:n, :n], start)])
+        improved = True
+        while improved:
+            improved = _two_opt(tour, dist)
+            tour, moved = _or_opt(tour, dist)
+            improved = improved or moved
+        length = _tour_length(tour, dist)
+        if length < best_length - MIN_GAIN_M:
+            best, best_length = tour, length
+    order = best[1:]
+    return Route(order.tolist(), dist[order[:-1], order[1:]].tolist())
+
+
+def route_key(locations):
+    # Content hash of a list's spots (list entries as in session state) in their stored order
+    return hashlib.sha1(json.dumps(
+        [[loc["name"], round(loc["latitude"], 6), round(loc["longitude"], 6)] for loc in locations]
+    ).encode("utf-8")).hexdigest()
+
+
+def get_route(locations):
+    # Cached Route through a list's spots; its order indexes into locations
+    return _cache.get_or_build(route_key(locations), lambda: solve_route(
+        [loc["latitude"] for loc in locations], [loc["longitude"] for loc in locations]))
+
+
+def clear_route_cache():
+    _cache.clear()
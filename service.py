@@ -0,0 +1,767 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+import database
+from database import connection, transaction
+from catalog import load_spots, load_spot_index, files_fingerprint
+from catalog_dir import load_catalog_dir
+from routes import get_route, route_key
+from instrumentation import timed
+
+# =============================
+# Data layer
+# =============================
+# Everything the app reads and writes, without Streamlit: the database schema and its queries,
+# the spot catalog and the folium map. Functions raise or return None instead of showing
+# messages, so scripts, workers and benchmarks can use them as they are; SO_GPT_MAT.py turns
+# errors into st.warning/st.error. Importing this module has no side effects, and folium is
+# only imported by the first call that builds a map.
+
+CSV_FILE_PATH = "final_CSV.csv"  # Your CSV with Name,Coordinates,Type
+CATALOG_DIR = "catalog"  # every CSV in here is added to the catalog and the map as its own layer
+CSV_SEPARATOR = None  # None detects the delimiter from the header, set e.g. ";" to force one
+SG_CENTER = [47.4245, 9.3767]
+MAP_ZOOM = 16
+MAX_VIEWPORT_MARKERS = 500  # per layer; zoomed far out only the spots closest to the centre are drawn
+LEADERBOARD_SIZE = 10  # lists shown in the "Trending" chart
+LISTS_PAGE_SIZE = 20  # lists per page of the "All Lists" feed
+USERS_PAGE_SIZE = 20  # profiles per page of "Other User Profiles"
+SEARCH_LIMIT = 20  # matches a type-ahead search returns, all that is sent to the browser
+FUZZY_MIN_SHARED = 0.3  # a fuzzy match shares at least this fraction of the query's trigrams
+
+_initialized = set()  # database paths whose schema is up to date in this process
+_init_lock = threading.Lock()
+
+# =============================
+# Database and User Management
+# =============================
+
+SCHEMA_VERSION = 3  # bump together with a new step in migrate_db()
+
+# Lists, their spots, likes and saves live in their own tables instead of JSON blobs in users
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS lists (
+        id INTEGER PRIMARY KEY,
+        owner TEXT NOT NULL REFERENCES users(username) ON UPDATE CASCADE ON DELETE CASCADE,
+        name TEXT NOT NULL,
+        likes INTEGER NOT NULL DEFAULT 0,
+        UNIQUE (owner, name)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_lists_name ON lists(name)",
+    "CREATE INDEX IF NOT EXISTS idx_lists_likes ON lists(likes DESC, id)",  # top-K leaderboard
+    # Every spot once, with a stable id (see locations.py); lists refer to spots by this id
+    """
+    CREATE TABLE IF NOT EXISTS locations (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        type TEXT NOT NULL,
+        latitude REAL NOT NULL,
+        longitude REAL NOT NULL,
+        UNIQUE (name, type)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS list_items (
+        list_id INTEGER NOT NULL REFERENCES lists(id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        location_id INTEGER NOT NULL REFERENCES locations(id),
+        PRIMARY KEY (list_id, position)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS likes (
+        username TEXT NOT NULL REFERENCES users(username) ON UPDATE CASCADE ON DELETE CASCADE,
+        list_id INTEGER NOT NULL REFERENCES lists(id) ON DELETE CASCADE,
+        PRIMARY KEY (username, list_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_likes_list ON likes(list_id)",
+    # lists.likes is the materialized count of a list's rows in likes, kept in step by these
+    # triggers inside the transaction that adds or removes the like (cascades included)
+    """
+    CREATE TRIGGER IF NOT EXISTS likes_count_on_insert AFTER INSERT ON likes
+    BEGIN UPDATE lists SET likes = likes + 1 WHERE id = NEW.list_id; END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS likes_count_on_delete AFTER DELETE ON likes
+    BEGIN UPDATE lists SET likes = likes - 1 WHERE id = OLD.list_id; END
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS saves (
+        username TEXT NOT NULL REFERENCES users(username) ON UPDATE CASCADE ON DELETE CASCADE,
+        list_id INTEGER NOT NULL REFERENCES lists(id) ON DELETE CASCADE,
+        file_path TEXT DEFAULT '',
+        PRIMARY KEY (username, list_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_saves_list ON saves(list_id)",
+    # Precomputed "Recommended for you" lists, see recommendations.py
+    """
+    CREATE TABLE IF NOT EXISTS recommendations (
+        username TEXT NOT NULL REFERENCES users(username) ON UPDATE CASCADE ON DELETE CASCADE,
+        rank INTEGER NOT NULL,
+        list_id INTEGER NOT NULL REFERENCES lists(id) ON DELETE CASCADE,
+        score REAL NOT NULL,
+        PRIMARY KEY (username, rank)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_recommendations_list ON recommendations(list_id)",
+    # user directory: case-insensitive order and prefix search, see get_user_page()
+    "CREATE INDEX IF NOT EXISTS idx_users_username_nocase ON users(username COLLATE NOCASE, username)",
+    # type-ahead search for queries shorter than a trigram, see _search()
+    "CREATE INDEX IF NOT EXISTS idx_locations_name_nocase ON locations(name COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS idx_lists_name_nocase ON lists(name COLLATE NOCASE)",
+    # lists_version goes up whenever a list is added, renamed, removed or its spots change,
+    # the Map tab's map cache (map_cache.py) is keyed by it
+    "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)",
+    "INSERT OR IGNORE INTO counters (name, value) VALUES ('lists_version', 0)",
+    """
+    CREATE TRIGGER IF NOT EXISTS lists_version_on_list_insert AFTER INSERT ON lists
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'lists_version'; END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS lists_version_on_list_delete AFTER DELETE ON lists
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'lists_version'; END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS lists_version_on_list_rename AFTER UPDATE OF name, owner ON lists
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'lists_version'; END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS lists_version_on_item_insert AFTER INSERT ON list_items
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'lists_version'; END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS lists_version_on_item_delete AFTER DELETE ON list_items
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'lists_version'; END
+    """,
+    # recommendation_inputs goes up whenever what recommendations are computed from changes;
+    # recommendations_built is its value when the stored ones were computed (-1: never)
+    "INSERT OR IGNORE INTO counters (name, value) VALUES ('recommendation_inputs', 0)",
+    "INSERT OR IGNORE INTO counters (name, value) VALUES ('recommendations_built', -1)",
+    """
+    CREATE TRIGGER IF NOT EXISTS recommendation_inputs_on_like AFTER INSERT ON likes
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'recommendation_inputs'; END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recommendation_inputs_on_unlike AFTER DELETE ON likes
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'recommendation_inputs'; END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recommendation_inputs_on_user_insert AFTER INSERT ON users
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'recommendation_inputs'; END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recommendation_inputs_on_activities AFTER UPDATE OF activities ON users
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'recommendation_inputs'; END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS lists_version_on_location_move AFTER UPDATE OF latitude, longitude ON locations
+    BEGIN UPDATE counters SET value = value + 1 WHERE name = 'lists_version'; END
+    """,
+]
+
+# Trigram full-text indexes over spot and list names for the type-ahead searches. They read
+# the names from their tables (external content) and are kept in step by triggers. FTS5 with
+# the trigram tokenizer needs SQLite 3.34; without it the searches scan the names instead.
+SEARCH_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS locations_search USING fts5("
+    "name, content='locations', content_rowid='id', tokenize='trigram')",
+    """
+    CREATE TRIGGER IF NOT EXISTS locations_search_on_insert AFTER INSERT ON locations
+    BEGIN INSERT INTO locations_search (rowid, name) VALUES (NEW.id, NEW.name); END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS locations_search_on_delete AFTER DELETE ON locations
+    BEGIN INSERT INTO locations_search (locations_search, rowid, name) VALUES ('delete', OLD.id, OLD.name); END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS locations_search_on_rename AFTER UPDATE OF name ON locations
+    BEGIN
+        INSERT INTO locations_search (locations_search, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+        INSERT INTO locations_search (rowid, name) VALUES (NEW.id, NEW.name);
+    END
+    """,
+    "CREATE VIRTUAL TABLE IF NOT EXISTS lists_search USING fts5("
+    "name, content='lists', content_rowid='id', tokenize='trigram')",
+    """
+    CREATE TRIGGER IF NOT EXISTS lists_search_on_insert AFTER INSERT ON lists
+    BEGIN INSERT INTO lists_search (rowid, name) VALUES (NEW.id, NEW.name); END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS lists_search_on_delete AFTER DELETE ON lists
+    BEGIN INSERT INTO lists_search (lists_search, rowid, name) VALUES ('delete', OLD.id, OLD.name); END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS lists_search_on_rename AFTER UPDATE OF name ON lists
+    BEGIN
+        INSERT INTO lists_search (lists_search, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+        INSERT INTO lists_search (rowid, name) VALUES (NEW.id, NEW.name);
+    END
+    """,
+]
+
+@timed
+def init_db():
+    with transaction() as cursor:
+        init_schema(cursor)
+
+def init_schema(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            password TEXT,
+            activities TEXT,
+            bio TEXT DEFAULT '',
+            profile_image TEXT DEFAULT '',
+            liked_lists TEXT DEFAULT '',
+            saved_lists TEXT DEFAULT '',
+            user_created_lists TEXT DEFAULT ''
+        )
+    """)
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(users);")]
+    if 'liked_lists' not in columns:
+        cursor.execute("ALTER TABLE users ADD COLUMN liked_lists TEXT DEFAULT ''")
+    if 'saved_lists' not in columns:
+        cursor.execute("ALTER TABLE users ADD COLUMN saved_lists TEXT DEFAULT ''")
+    if 'user_created_lists' not in columns:
+        cursor.execute("ALTER TABLE users ADD COLUMN user_created_lists TEXT DEFAULT ''")
+
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    migrate_db(cursor)
+    init_search_index(cursor)
+
+def init_search_index(cursor):
+    # Create the search indexes; a newly created one is filled from the rows already there
+    existing = {name for (name,) in cursor.execute(
+        "SELECT name FROM sqlite_master WHERE name IN ('locations_search', 'lists_search')"
+    )}
+    try:
+        for statement in SEARCH_SCHEMA:
+            cursor.execute(statement)
+    except sqlite3.OperationalError:
+        return  # no FTS5 or no trigram tokenizer in this SQLite
+    for table in ("locations_search", "lists_search"):
+        if table not in existing:
+            cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+
+def migrate_db(cursor):
+    # One-time upgrade steps, tracked with PRAGMA user_version
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+    if version < 1:
+        # Move the old JSON columns into the tables above
+        rows = cursor.execute(
+            "SELECT username, liked_lists, saved_lists, user_created_lists FROM users ORDER BY rowid"
+        ).fetchall()
+        # Lists first, so likes and saves of other users can point at them
+        for username, _, _, user_created_lists in rows:
+            created = json.loads(user_created_lists) if user_created_lists else {}
+            write_user_lists(cursor, username, created)
+        for username, liked_lists, saved_lists, _ in rows:
+            liked = json.loads(liked_lists) if liked_lists else {}
+            saved = json.loads(saved_lists) if saved_lists else {}
+            write_user_likes(cursor, username, liked)
+            write_user_saves(cursor, username, saved)
+    if version < 2:
+        # Counts used to be copied from session state; from now on they are the number of like rows
+        cursor.execute("UPDATE lists SET likes = (SELECT COUNT(*) FROM likes WHERE likes.list_id = lists.id)")
+    if version < 3 and cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'list_locations'"
+    ).fetchone():
+        # Lists held their own copy of every spot; they now point at the locations table
+        cursor.execute("""
+            INSERT OR IGNORE INTO locations (name, type, latitude, longitude)
+            SELECT name, type, latitude, longitude FROM list_locations ORDER BY list_id, position
+        """)
+        cursor.execute("""
+            INSERT INTO list_items (list_id, position, location_id)
+            SELECT ll.list_id, ll.position, loc.id
+            FROM list_locations ll JOIN locations loc ON loc.name = ll.name AND loc.type = ll.type
+        """)
+        cursor.execute("DROP TABLE list_locations")
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def find_list_id(cursor, list_name):
+    # Lists are shown by name only; on duplicates the newest one wins, like the old combined dict
+    result = cursor.execute(
+        "SELECT id FROM lists WHERE name = ? ORDER BY id DESC LIMIT 1", (list_name,)
+    ).fetchone()
+    return result[0] if result else None
+
+def find_location_id(cursor, location):
+    # Catalog entries carry their id; older ones (JSON blobs) are looked up, or added, by name and type
+    if location.get("id") is not None:
+        return location["id"]
+    cursor.execute(
+        "INSERT OR IGNORE INTO locations (name, type, latitude, longitude) VALUES (?, ?, ?, ?)",
+        (location["name"], location["type"], float(location["latitude"]), float(location["longitude"]))
+    )
+    return cursor.execute(
+        "SELECT id FROM locations WHERE name = ? AND type = ?", (location["name"], location["type"])
+    ).fetchone()[0]
+
+def write_user_lists(cursor, username, user_created_lists):
+    # Upsert by (owner, name) so likes and saves of unchanged lists survive; drop lists that are gone.
+    # The "likes" entries are ignored, the count belongs to the likes table.
+    existing = dict(cursor.execute("SELECT name, id FROM lists WHERE owner = ?", (username,)).fetchall())
+    for list_name in set(existing) - set(user_created_lists):
+        cursor.execute("DELETE FROM lists WHERE id = ?", (existing[list_name],))
+    for list_name, list_data in user_created_lists.items():
+        location_ids = [find_location_id(cursor, loc) for loc in list_data.get("locations", [])]
+        if list_name in existing:
+            list_id = existing[list_name]
+            current = [location_id for (location_id,) in cursor.execute(
+                "SELECT location_id FROM list_items WHERE list_id = ? ORDER BY position", (list_id,)
+            )]
+            if current == location_ids:  # unchanged spots are left alone, so lists_version stays put
+                continue
+            cursor.execute("DELETE FROM list_items WHERE list_id = ?", (list_id,))
+        else:
+            cursor.execute("INSERT INTO lists (owner, name) VALUES (?, ?)", (username, list_name))
+            list_id = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO list_items (list_id, position, location_id) VALUES (?, ?, ?)",
+            [(list_id, i, location_id) for i, location_id in enumerate(location_ids)]
+        )
+
+def write_user_likes(cursor, username, liked_lists):
+    # Only the difference is written, so the counters of untouched lists don't move
+    current = {list_id for (list_id,) in cursor.execute("SELECT list_id FROM likes WHERE username = ?", (username,))}
+    wanted = {find_list_id(cursor, list_name) for list_name, liked in liked_lists.items() if liked} - {None}
+    cursor.executemany("DELETE FROM likes WHERE username = ? AND list_id = ?",
+                       [(username, list_id) for list_id in current - wanted])
+    cursor.executemany("INSERT INTO likes (username, list_id) VALUES (?, ?)",
+                       [(username, list_id) for list_id in wanted - current])
+
+@timed
+def like_list(username, list_id):
+    # One like per (user, list); the count is bumped by a trigger in the same transaction
+    with transaction() as cursor:
+        cursor.execute("INSERT OR IGNORE INTO likes (username, list_id) VALUES (?, ?)", (username, list_id))
+
+@timed
+def unlike_list(username, list_id):
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM likes WHERE username = ? AND list_id = ?", (username, list_id))
+
+def rename_list(cursor, username, old_name, new_name):
+    # In place, so the list keeps its id and with it its likes and saves.
+    # An own list already called new_name is replaced, as it was in the session dict.
+    cursor.execute("DELETE FROM lists WHERE owner = ? AND name = ?", (username, new_name))
+    cursor.execute("UPDATE lists SET name = ? WHERE owner = ? AND name = ?", (new_name, username, old_name))
+
+@timed
+def get_top_lists(k=LEADERBOARD_SIZE):
+    # -> [(list name, likes)], most liked first; walks idx_lists_likes until k lists are found
+    # that are not shadowed by a newer list with the same name (see get_list_page)
+    with connection() as conn:
+        return conn.execute("""
+            SELECT l.name, l.likes FROM lists l
+            WHERE NOT EXISTS (SELECT 1 FROM lists n WHERE n.name = l.name AND n.id > l.id)
+            ORDER BY l.likes DESC, l.id LIMIT ?
+        """, (k,)).fetchall()
+
+@timed
+def get_list_page(before_id=None, limit=LISTS_PAGE_SIZE):
+    # One page of the "All Lists" feed, newest first, paged by id (keyset) so every page is an
+    # index range scan: -> [(id, name, owner, likes, number of spots)]. As everywhere else, of
+    # several lists with the same name only the newest is shown.
+    query = """
+        SELECT l.id, l.name, l.owner, l.likes,
+               (SELECT COUNT(*) FROM list_items li WHERE li.list_id = l.id)
+        FROM lists l
+        WHERE NOT EXISTS (SELECT 1 FROM lists n WHERE n.name = l.name AND n.id > l.id)
+    """
+    params = ()
+    if before_id is not None:
+        query += " AND l.id < ?"
+        params = (before_id,)
+    query += " ORDER BY l.id DESC LIMIT ?"
+    with connection() as conn:
+        return conn.execute(query, params + (limit,)).fetchall()
+
+@timed
+def get_list_locations(list_id):
+    with connection() as conn:
+        rows = conn.execute("""
+            SELECT loc.id, loc.name, loc.type, loc.latitude, loc.longitude
+            FROM list_items li JOIN locations loc ON loc.id = li.location_id
+            WHERE li.list_id = ? ORDER BY li.position
+        """, (list_id,)).fetchall()
+    return [{"id": location_id, "name": name, "type": loc_type, "latitude": lat, "longitude": lon}
+            for location_id, name, loc_type, lat, lon in rows]
+
+@timed
+def get_liked_locations(username):
+    # -> [(list name, spot name, type, latitude, longitude)] of every list the user likes
+    with connection() as conn:
+        return conn.execute("""
+            SELECT l.name, loc.name, loc.type, loc.latitude, loc.longitude
+            FROM likes k JOIN lists l ON l.id = k.list_id
+            JOIN list_items li ON li.list_id = l.id JOIN locations loc ON loc.id = li.location_id
+            WHERE k.username = ? ORDER BY l.id, li.position
+        """, (username,)).fetchall()
+
+@timed
+def get_saved_locations(username):
+    # Same for the lists the user saved
+    with connection() as conn:
+        return conn.execute("""
+            SELECT l.name, loc.name, loc.type, loc.latitude, loc.longitude
+            FROM saves s JOIN lists l ON l.id = s.list_id
+            JOIN list_items li ON li.list_id = l.id JOIN locations loc ON loc.id = li.location_id
+            WHERE s.username = ? ORDER BY l.id, li.position
+        """, (username,)).fetchall()
+
+def write_user_saves(cursor, username, saved_lists):
+    cursor.execute("DELETE FROM saves WHERE username = ?", (username,))
+    for list_name, file_path in saved_lists.items():
+        list_id = find_list_id(cursor, list_name)
+        if list_id is not None:
+            cursor.execute(
+                "INSERT OR IGNORE INTO saves (username, list_id, file_path) VALUES (?, ?, ?)",
+                (username, list_id, file_path or "")
+            )
+
+def read_lists(cursor, owner=None):
+    # All lists (or one owner's) with their spots in a single indexed query
+    query = """
+        SELECT l.id, l.name, l.likes, loc.id, loc.name, loc.type, loc.latitude, loc.longitude
+        FROM lists l
+        LEFT JOIN list_items li ON li.list_id = l.id
+        LEFT JOIN locations loc ON loc.id = li.location_id
+    """
+    params = ()
+    if owner is not None:
+        query += " WHERE l.owner = ?"
+        params = (owner,)
+    query += " ORDER BY l.id, li.position"
+    lists = {}
+    list_ids = {}
+    for list_id, list_name, likes, location_id, loc_name, loc_type, lat, lon in cursor.execute(query, params):
+        if list_ids.get(list_name) != list_id:  # a newer list with the same name replaces the older one
+            list_ids[list_name] = list_id
+            lists[list_name] = {"likes": likes, "locations": []}
+        entry = lists[list_name]
+        if loc_name is not None:
+            entry["locations"].append(
+                {"id": location_id, "name": loc_name, "type": loc_type, "latitude": lat, "longitude": lon}
+            )
+    return lists
+
+@timed
+def save_user(username, password, activities, bio='', profile_image=''):
+    with transaction() as cursor:
+        cursor.execute(
+            "INSERT INTO users (username, password, activities, bio, profile_image) VALUES (?, ?, ?, ?, ?)",
+            (username, password, ",".join(activities), bio, profile_image)
+        )
+
+@timed
+def authenticate_user(username, password):
+    with connection() as conn:
+        result = conn.execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
+    if result and result[0] == hash_password(password):
+        return True
+    return False
+
+@timed
+def get_user_profile(username):
+    with connection() as conn:
+        cursor = conn.cursor()
+        result = cursor.execute(
+            "SELECT activities, bio, profile_image FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        if not result:
+            return None
+        activities, bio, profile_image = result
+        liked_lists = {name: True for (name,) in cursor.execute(
+            "SELECT l.name FROM likes k JOIN lists l ON l.id = k.list_id WHERE k.username = ?", (username,)
+        )}
+        saved_lists = dict(cursor.execute(
+            "SELECT l.name, s.file_path FROM saves s JOIN lists l ON l.id = s.list_id WHERE s.username = ?", (username,)
+        ).fetchall())
+        user_created_lists = read_lists(cursor, owner=username)
+    return {
+        "activities": activities.split(",") if activities else [],
+        "bio": bio,
+        "profile_image": profile_image,
+        "liked_lists": liked_lists,
+        "saved_lists": saved_lists,
+        "user_created_lists": user_created_lists
+    }
+
+@timed
+def update_user_profile(username, new_username=None, new_password=None, new_bio=None, new_profile_image=None,
+                        new_activities=None, new_liked_lists=None, new_saved_lists=None, new_user_created_lists=None,
+                        renamed_lists=None):
+    # renamed_lists: {old name: new name} of own lists, renamed before the lists are written,
+    # so an edit that also renames a list is stored as a whole or not at all
+    with transaction() as cursor:
+        for old_name, new_name in (renamed_lists or {}).items():
+            rename_list(cursor, username, old_name, new_name)
+        # Lists are written first since likes and saves may point at lists created in the same update
+        if new_user_created_lists is not None:
+            write_user_lists(cursor, username, new_user_created_lists)
+        if new_liked_lists is not None:
+            write_user_likes(cursor, username, new_liked_lists)
+        if new_saved_lists is not None:
+            write_user_saves(cursor, username, new_saved_lists)
+        if new_password:
+            cursor.execute("UPDATE users SET password = ? WHERE username = ?", (new_password, username))
+        if new_bio is not None:
+            cursor.execute("UPDATE users SET bio = ? WHERE username = ?", (new_bio, username))
+        if new_profile_image is not None:
+            cursor.execute("UPDATE users SET profile_image = ? WHERE username = ?", (new_profile_image, username))
+        if new_activities is not None:
+            cursor.execute("UPDATE users SET activities = ? WHERE username = ?", (",".join(new_activities), username))
+        if new_username:  # last, the foreign keys cascade the rename to lists, likes and saves
+            cursor.execute("UPDATE users SET username = ? WHERE username = ?", (new_username, username))
+
+@timed
+def delete_user(username):
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM users WHERE username = ?", (username,))
+
+def _nocase(text):
+    # SQLite's NOCASE collation only folds ASCII letters
+    return "".join(c.lower() if c.isascii() else c for c in text)
+
+def _prefix_bounds(prefix):
+    # -> (low, high): text starts with prefix, ignoring case, iff low <= text COLLATE NOCASE < high
+    low = _nocase(prefix)
+    return low, low + "\U0010ffff"
+
+@timed
+def get_user_page(prefix="", after=None, limit=USERS_PAGE_SIZE, exclude=None):
+    # One page of the user directory in a single query, ordered by username ignoring case:
+    # -> [{"username", "activities", "bio", "profile_image", "lists": [{"id", "name", "likes", "spots"}]}]
+    # prefix: case-insensitive username prefix; after: last username of the previous page (keyset
+    # paging); exclude: a username to leave out, usually the logged-in user. Both the prefix and
+    # the page start are ranges on idx_users_username_nocase, so a page costs the same at any depth.
+    prefix, high = _prefix_bounds(prefix)
+    low = max(prefix, after or "", key=_nocase)
+    with connection() as conn:
+        rows = conn.execute("""
+            WITH page AS (
+                SELECT username, activities, bio, profile_image FROM users
+                WHERE username COLLATE NOCASE >= ? AND username COLLATE NOCASE < ?
+                  AND (username COLLATE NOCASE, username) > (?, ?) AND username IS NOT ?
+                ORDER BY username COLLATE NOCASE, username LIMIT ?
+            )
+            SELECT p.username, p.activities, p.bio, p.profile_image, l.id, l.name, l.likes,
+                   (SELECT COUNT(*) FROM list_items li WHERE li.list_id = l.id)
+            FROM page p LEFT JOIN lists l ON l.owner = p.username
+            ORDER BY p.username COLLATE NOCASE, p.username, l.id
+        """, (low, high, after or "", after or "", exclude, limit)).fetchall()
+    users = []
+    for username, activities, bio, profile_image, list_id, list_name, likes, spots in rows:
+        if not users or users[-1]["username"] != username:
+            users.append({"username": username, "activities": activities.split(",") if activities else [],
+                          "bio": bio, "profile_image": profile_image, "lists": []})
+        if list_id is not None:
+            users[-1]["lists"].append({"id": list_id, "name": list_name, "likes": likes, "spots": spots})
+    return users
+
+def _fts_string(text):
+    # text as one FTS5 string; with the trigram tokenizer it matches wherever it occurs in a name
+    return '"' + text.replace('"', '""') + '"'
+
+def _trigrams(text):
+    text = text.lower()
+    return list(dict.fromkeys(text[i:i + 3] for i in range(len(text) - 2)))
+
+def _search(conn, table, columns, query, where="", params=(), limit=SEARCH_LIMIT):
+    # Top matches for a type-ahead query over the names of table (aliased t) -> rows of columns.
+    # Names starting with the query come first, then names containing it, best bm25 rank first.
+    # When those are fewer than limit, names that share most of the query's trigrams fill up
+    # the rest, so a typo still finds the spot. Queries shorter than a trigram are a prefix
+    # range on the name's NOCASE index (an empty query lists names from A).
+    query = query.strip()
+    if len(query) < 3:
+        low, high = _prefix_bounds(query)
+        return conn.execute(f"""
+            SELECT {columns} FROM {table} t
+            WHERE t.name COLLATE NOCASE >= ? AND t.name COLLATE NOCASE < ?{where}
+            ORDER BY t.name COLLATE NOCASE, t.id LIMIT ?
+        """, (low, high) + params + (limit,)).fetchall()
+    matching = f"SELECT {columns} FROM {table}_search s JOIN {table} t ON t.id = s.rowid WHERE {table}_search MATCH ?{where}"
+    try:
+        rows = conn.execute(
+            matching + " ORDER BY instr(lower(t.name), lower(?)) != 1, rank, t.id LIMIT ?",
+            (_fts_string(query),) + params + (query, limit)
+        ).fetchall()
+        grams = _trigrams(query)
+        if len(rows) < limit and len(grams) > 1:
+            found = {row[0] for row in rows}
+            needed = max(2, int(len(grams) * FUZZY_MIN_SHARED + 0.5))
+            candidates = conn.execute(
+                matching + " ORDER BY rank, t.id LIMIT ?",
+                (" OR ".join(_fts_string(gram) for gram in grams),) + params + (limit * 5,)
+            ).fetchall()
+            for row in candidates:
+                if len(rows) == limit:
+                    break
+                name = row[1].lower()
+                if row[0] not in found and sum(gram in name for gram in grams) >= needed:
+                    rows.append(row)
+        return rows
+    except sqlite3.OperationalError:
+        # no search index in this database (see init_search_index): substring scan, no fuzzy matches
+        return conn.execute(f"""
+            SELECT {columns} FROM {table} t WHERE instr(lower(t.name), lower(?)) > 0{where}
+            ORDER BY instr(lower(t.name), lower(?)) != 1, t.name COLLATE NOCASE, t.id LIMIT ?
+        """, (query,) + params + (query, limit)).fetchall()
+
+@timed
+def search_locations(query, types=None, limit=SEARCH_LIMIT):
+    # Type-ahead search over every known spot -> [(id, name, type)], best matches first, see
+    # _search(); types: only spots of these types
+    where, params = "", ()
+    if types:
+        where = f" AND t.type IN ({', '.join('?' * len(types))})"
+        params = tuple(types)
+    with connection() as conn:
+        return _search(conn, "locations", "t.id, t.name, t.type", query, where, params, limit)
+
+@timed
+def search_lists(query, limit=SEARCH_LIMIT):
+    # Type-ahead search over list names -> rows shaped like get_list_page(); as there, of
+    # several lists with the same name only the newest is found
+    with connection() as conn:
+        return _search(
+            conn, "lists", "t.id, t.name, t.owner, t.likes, (SELECT COUNT(*) FROM list_items li WHERE li.list_id = t.id)",
+            query, " AND NOT EXISTS (SELECT 1 FROM lists n WHERE n.name = t.name AND n.id > t.id)", (), limit
+        )
+
+def hash_password(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def ensure_db():
+    # init_db() once per process and database file; reruns skip the schema statements
+    if database.DB_PATH in _initialized:
+        return
+    with _init_lock:
+        if database.DB_PATH not in _initialized:
+            init_db()
+            _initialized.add(database.DB_PATH)
+
+@timed
+def get_lists_version():
+    with connection() as conn:
+        result = conn.execute("SELECT value FROM counters WHERE name = 'lists_version'").fetchone()
+    return result[0] if result else 0
+
+@timed
+def get_all_user_created_lists():
+    with connection() as conn:
+        return read_lists(conn.cursor())
+
+# =============================
+# Spot catalog and map
+# =============================
+
+def get_catalog():
+    # catalog_dir.CatalogSet of CSV_FILE_PATH and the CSVs in CATALOG_DIR, rescanned every few seconds
+    return load_catalog_dir(CATALOG_DIR, extra_files=[CSV_FILE_PATH], sep=CSV_SEPARATOR)
+
+def load_catalog_spots(file_path, sep=CSV_SEPARATOR):
+    # Columnar spots (catalog.SpotColumns) of a catalog CSV, None when it has no valid rows.
+    # Raises FileNotFoundError, or ValueError when the required columns are missing.
+    data = load_spots(file_path, sep=sep)
+    return data if len(data) else None
+
+def in_viewport(lat, lon, viewport):
+    south, west, north, east = viewport
+    return south <= lat <= north and west <= lon <= east
+
+def build_csv_layer(csv_file, viewport=None, render_mode="markers", sep=CSV_SEPARATOR):
+    # None when the file is missing or has no valid rows; the layer is left out of the map
+    import folium
+    from map_layers import add_spots
+    try:
+        data = load_catalog_spots(csv_file, sep=sep)
+    except (FileNotFoundError, ValueError):
+        return None
+    if not data:
+        return None
+    feature_group = folium.FeatureGroup(name=os.path.splitext(os.path.basename(csv_file))[0])
+    indices = None
+    if viewport is not None:  # grid index lookup instead of a scan over every spot
+        index = load_spot_index(csv_file, sep=sep)
+        indices = index.within_bounds(*viewport, limit=MAX_VIEWPORT_MARKERS)
+    columns = list(zip(*data.rows(indices))) or [[], [], [], []]
+    add_spots(feature_group, *columns, mode=render_mode)
+    return feature_group
+
+def build_user_list_layer(list_name, list_data, viewport=None, render_mode="markers"):
+    import folium
+    from map_layers import add_spots
+    user_feature_group = folium.FeatureGroup(name=f"User List: {list_name}")
+    locations = [
+        loc for loc in list_data["locations"]
+        if viewport is None or in_viewport(loc['latitude'], loc['longitude'], viewport)
+    ]
+    add_spots(user_feature_group,
+              [loc['name'] for loc in locations], [loc['type'] for loc in locations],
+              [loc['latitude'] for loc in locations], [loc['longitude'] for loc in locations],
+              mode=render_mode)
+    return user_feature_group
+
+def build_route_layer(list_name, list_data):
+    # The shortest walk through a list's spots (routes.get_route) as a polyline with numbered
+    # stops; None for lists with fewer than two spots
+    import folium
+    locations = list_data["locations"]
+    if len(locations) < 2:
+        return None
+    route = get_route(locations)
+    stops = [locations[position] for position in route.order]
+    route_feature_group = folium.FeatureGroup(name=f"Route: {list_name}")
+    folium.PolyLine(
+        [[loc["latitude"], loc["longitude"]] for loc in stops],
+        tooltip=f"{list_name}: {route.length_m / 1000:.2f} km walk, {len(stops)} stops",
+        weight=4, opacity=0.8,
+    ).add_to(route_feature_group)
+    for number, loc in enumerate(stops, start=1):
+        folium.CircleMarker(
+            [loc["latitude"], loc["longitude"]], radius=6, fill=True, fill_opacity=1.0,
+            tooltip=f"{number}. {loc['name']}",
+        ).add_to(route_feature_group)
+    return route_feature_group
+
+@timed
+def create_map_with_feature_groups(csv_files, user_lists=None, viewport=None, center=None, zoom=MAP_ZOOM,
+                                   render_mode="markers", sep=CSV_SEPARATOR, routes=False):
+    # viewport=(south, west, north, east) only adds the markers inside that box,
+    # render_mode is one of map_layers.RENDER_MODES, routes=True adds every list's walking
+    # route as its own layer (always the whole route, also with a viewport).
+    # Every layer is rendered once per content hash and reused (map_layers.add_cached_layer),
+    # so after editing one list only that list's layer is rendered again.
+    import folium
+    from map_layers import create_base_map, layer_key, add_cached_layer
+    map_obj = create_base_map(center or SG_CENTER, zoom)
+
+    # Add CSV-based feature groups
+    for csv_file in csv_files:
+        key = layer_key("csv", csv_file, files_fingerprint([csv_file]), viewport, render_mode, sep)
+        add_cached_layer(map_obj, key, lambda: build_csv_layer(csv_file, viewport, render_mode, sep))
+
+    # Add user-created lists as feature groups
+    if user_lists:
+        for list_name, list_data in user_lists.items():
+            key = layer_key("list", list_name, json.dumps(list_data["locations"], sort_keys=True), viewport, render_mode)
+            add_cached_layer(map_obj, key, lambda: build_user_list_layer(list_name, list_data, viewport, render_mode))
+            if routes:
+                key = layer_key("route", list_name, route_key(list_data["locations"]))
+                add_cached_layer(map_obj, key, lambda: build_route_layer(list_name, list_data))
+
+    folium.LayerControl().add_to(map_obj)
+    return map_obj
@@ -0,0 +1,147 @@
+import math
+import numpy as np
+
+# =============================
+# Spatial index over spot coordinates
+# =============================
+# Spots are projected to metres (equirectangular around the catalog's mean latitude, plenty
+# accurate at city scale) and bucketed into a uniform grid. The points are stored sorted by
+# cell, so a radius query only looks at the few cells overlapping the circle and then
+# filters those candidates with an exact, vectorized haversine distance.
+
+EARTH_RADIUS_M = 6371008.8
+DEFAULT_CELL_SIZE_M = 100
+
+
+def viewport_bounds(center, zoom, width_px=725, height_px=700):
+    # Approximate (south, west, north, east) of a web-mercator map view of the given pixel size
+    metres_per_px = 156543.03392 * math.cos(math.radians(center[0])) / (2 ** zoom)
+    dlat = math.degrees(metres_per_px * height_px / 2 / EARTH_RADIUS_M)
+    dlon = math.degrees(metres_per_px * width_px / 2 / (EARTH_RADIUS_M * max(math.cos(math.radians(center[0])), 1e-6)))
+    return center[0] - dlat, center[1] - dlon, center[0] + dlat, center[1] + dlon
+
+
+def expand_bounds(bounds, margin):
+    # Grow (south, west, north, east) by margin times its height/width on every side
+    south, west, north, east = bounds
+    dlat, dlon = (north - south) * margin, (east - west) * margin
+    return south - dlat, west - dlon, north + dlat, east + dlon
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    # Great-circle distance in metres, broadcasts over numpy arrays
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class SpotIndex:
+    def __init__(self, latitude, longitude, type_codes=None, types=None, cell_size_m=DEFAULT_CELL_SIZE_M):
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        n = len(self.latitude)
+        self.type_codes = np.zeros(n, dtype=np.int32) if type_codes is None else np.asarray(type_codes)
+        self.types = np.asarray(types if types is not None else [], dtype=object)
+        self.cell_size_m = float(cell_size_m)
+
+        self.lat0 = float(self.latitude.mean()) if n else 0.0
+        self.lon0 = float(self.longitude.mean()) if n else 0.0
+        self._cos_lat0 = math.cos(math.radians(self.lat0))
+        if n:
+            lat_min, lat_max = self.latitude.min(), self.latitude.max()
+            lon_min, lon_max = self.longitude.min(), self.longitude.max()
+            self._corners = (np.array([lat_min, lat_min, lat_max, lat_max]), np.array([lon_min, lon_max, lon_min, lon_max]))
+
+        x, y = self._project(self.latitude, self.longitude)
+        ix = np.floor(x / self.cell_size_m).astype(np.int64)
+        iy = np.floor(y / self.cell_size_m).astype(np.int64)
+        self._ix_min = int(ix.min()) if n else 0
+        self._iy_min = int(iy.min()) if n else 0
+        self._ix_max = int(ix.max()) if n else -1
+        self._iy_max = int(iy.max()) if n else -1
+        self._ny = self._iy_max - self._iy_min + 1
+
+        keys = (ix - self._ix_min) * self._ny + (iy - self._iy_min)
+        self._order = np.argsort(keys, kind="stable")
+        self._cell_keys, self._cell_starts, counts = np.unique(keys[self._order], return_index=True, return_counts=True)
+        self._cell_ends = self._cell_starts + counts
+
+    @classmethod
+    def from_spots(cls, spots, cell_size_m=DEFAULT_CELL_SIZE_M):
+        # spots: catalog.SpotColumns
+        return cls(spots.latitude, spots.longitude, spots.type_codes, spots.types, cell_size_m=cell_size_m)
+
+    def __len__(self):
+        return len(self.latitude)
+
+    def _project(self, lat, lon):
+        x = EARTH_RADIUS_M * np.radians(np.asarray(lon) - self.lon0) * self._cos_lat0
+        y = EARTH_RADIUS_M * np.radians(np.asarray(lat) - self.lat0)
+        return x, y
+
+    def _type_mask(self, indices, types):
+        if not types:
+            return indices
+        wanted = np.flatnonzero(np.isin(self.types, list(types)))
+        return indices[np.isin(self.type_codes[indices], wanted)]
+
+    def _candidates(self, lat, lon, radius_m):
+        # Indices of all spots in grid cells overlapping the bounding box of the circle
+        dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+        dlon = math.degrees(radius_m / (EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 1e-6)))
+        return self._candidates_in_box(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+
+    def _candidates_in_box(self, south, west, north, east):
+        # Indices of all spots in grid cells overlapping the box
+        if not len(self):
+            return np.empty(0, dtype=np.int64)
+        (x_lo, x_hi), (y_lo, y_hi) = self._project([south, north], [west, east])
+        ix_lo = max(int(math.floor(x_lo / self.cell_size_m)), self._ix_min)
+        ix_hi = min(int(math.floor(x_hi / self.cell_size_m)), self._ix_max)
+        iy_lo = max(int(math.floor(y_lo / self.cell_size_m)), self._iy_min)
+        iy_hi = min(int(math.floor(y_hi / self.cell_size_m)), self._iy_max)
+        if ix_lo > ix_hi or iy_lo > iy_hi:
+            return np.empty(0, dtype=np.int64)
+
+        # Every grid column is one contiguous run of keys, so each column is a single slice
+        columns = np.arange(ix_lo - self._ix_min, ix_hi - self._ix_min + 1, dtype=np.int64) * self._ny
+        lo = np.searchsorted(self._cell_keys, columns + (iy_lo - self._iy_min), side="left")
+        hi = np.searchsorted(self._cell_keys, columns + (iy_hi - self._iy_min), side="right")
+        slices = [self._order[self._cell_starts[a]:self._cell_ends[b - 1]] for a, b in zip(lo, hi) if b > a]
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def within_radius(self, lat, lon, radius_m, types=None):
+        # -> (indices, distances in metres) of spots within radius_m, nearest first
+        candidates = self._type_mask(self._candidates(lat, lon, radius_m), types)
+        distances = haversine_m(lat, lon, self.latitude[candidates], self.longitude[candidates])
+        inside = distances <= radius_m
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances, kind="stable")
+        return candidates[order], distances[order]
+
+    def within_bounds(self, south, west, north, east, types=None, limit=None):
+        # -> indices of spots inside the box; beyond limit only the ones closest to its centre are kept
+        candidates = self._type_mask(self._candidates_in_box(south, west, north, east), types)
+        lat, lon = self.latitude[candidates], self.longitude[candidates]
+        candidates = candidates[(lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)]
+        if limit is not None and len(candidates) > limit:
+            distances = haversine_m((south + north) / 2, (west + east) / 2,
+                                    self.latitude[candidates], self.longitude[candidates])
+            candidates = candidates[np.argpartition(distances, limit)[:limit]]
+        return np.sort(candidates)
+
+    def nearest(self, lat, lon, k=5, types=None, max_radius_m=None):
+        # -> (indices, distances) of the k nearest spots, found by growing a radius search
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        # no spot is farther away than the farthest corner of the catalog's bounding box
+        limit = float(haversine_m(lat, lon, *self._corners).max()) + 1.0
+        if max_radius_m is not None:
+            limit = min(limit, max_radius_m)
+
+        radius = min(self.cell_size_m, limit)
+        while True:
+            indices, distances = self.within_radius(lat, lon, radius, types)
+            if len(indices) >= k or radius >= limit:
+                return indices[:k], distances[:k]
+            radius = min(radius * 2, limit)
@@ -0,0 +1,69 @@
+import io
+from instrumentation import timed
+from lru import LRUCache
+
+# =============================
+# "Trending" leaderboard chart
+# =============================
+# The chart only changes when a like does, so it is rendered once per leaderboard content
+# ([(list name, likes)], most liked first) and the PNG bytes are reused on every rerun.
+# Figures are built with the object-oriented matplotlib API: they never enter pyplot's global
+# figure registry and are released as soon as the PNG is written. chart_spec() is the
+# alternative without matplotlib, a Vega-Lite spec the browser draws itself.
+
+CHART_CACHE_SIZE = 32
+BACKGROUND = "#0e1117"
+BAR_COLOR = "skyblue"
+TEXT_COLOR = "white"
+
+_cache = LRUCache(CHART_CACHE_SIZE)  # tuple of (name, likes) rows -> PNG bytes
+
+
+@timed
+def render_chart_png(rows, dpi=100):
+    # Horizontal bar chart of rows as PNG bytes, same look as the original st.pyplot chart
+    from matplotlib.figure import Figure  # imported on first render only
+
+    names = [name for name, _ in rows]
+    likes = [count for _, count in rows]
+    fig = Figure(figsize=(8, 5), facecolor=BACKGROUND)
+    try:
+        ax = fig.subplots()
+        ax.set_facecolor(BACKGROUND)
+        bars = ax.barh(names, likes, color=BAR_COLOR)
+        ax.set_xlabel("Likes", fontsize=12, color=TEXT_COLOR)
+        ax.tick_params(axis="x", colors=TEXT_COLOR)
+        ax.tick_params(axis="y", colors=TEXT_COLOR)
+        ax.bar_label(bars, labels=[str(int(count)) for count in likes], padding=3, fontsize=10, color=TEXT_COLOR)
+        ax.invert_yaxis()
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", dpi=dpi, facecolor=BACKGROUND, bbox_inches="tight")
+        return buffer.getvalue()
+    finally:
+        fig.clear()
+
+
+def get_chart_png(rows):
+    # Cached render_chart_png(); rows is the leaderboard, e.g. get_top_lists()
+    key = tuple((str(name), int(count)) for name, count in rows)
+    return _cache.get_or_build(key, lambda: render_chart_png(key))
+
+
+def chart_spec(rows):
+    # Vega-Lite spec of the same chart, for st.vega_lite_chart()
+    return {
+        "width": "container",
+        "data": {"values": [{"List": name, "Likes": int(count)} for name, count in rows]},
+        "layer": [
+            {"mark": {"type": "bar", "color": BAR_COLOR}},
+            {"mark": {"type": "text", "align": "left", "dx": 4, "color": TEXT_COLOR}, "encoding": {"text": {"field": "Likes"}}},
+        ],
+        "encoding": {
+            "y": {"field": "List", "type": "nominal", "sort": None, "title": None},
+            "x": {"field": "Likes", "type": "quantitative", "axis": {"tickMinStep": 1}},
+        },
+    }
+
+
+def clear_chart_cache():
+    _cache.clear()